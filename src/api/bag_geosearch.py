@@ -1,7 +1,9 @@
 import logging
+import threading
 
 import requests
 from django.conf import settings
+from django.core.cache import caches
 from requests import RequestException
 
 from datasets.blackspots.models import Spot
@@ -14,11 +16,92 @@ class BagGeoSearchAPI:
 
     FEATURE_STADSDEEL = "gebieden/stadsdeel"
 
+    CACHE_NAME = "bag_geosearch"
+    STATS_CACHE_NAME = "bag_geosearch_stats"
+    CACHE_STATS = ("hits", "misses")
+    STATS_INCR_ATTEMPTS = 3
+
+    # the file based cache increments with a read and a write, so threads of a process take turns
+    _stats_lock = threading.Lock()
+
+    @staticmethod
+    def get_cache():
+        return caches[BagGeoSearchAPI.CACHE_NAME]
+
+    @staticmethod
+    def get_stats_cache():
+        return caches[BagGeoSearchAPI.STATS_CACHE_NAME]
+
+    @staticmethod
+    def get_cache_key(lat, lon):
+        """
+        Points that are (almost) the same share a cache key, by rounding
+        lat/lon to BAG_GEO_SEARCH_CACHE_PRECISION decimals.
+        """
+        precision = settings.BAG_GEO_SEARCH_CACHE_PRECISION
+        return f"stadsdeel:{lat:.{precision}f}:{lon:.{precision}f}"
+
+    @staticmethod
+    def get_stats_key(stat):
+        return f"stats:{stat}"
+
+    @classmethod
+    def count(cls, stat):
+        """
+        Increments the stat in the shared stats cache, so the counts of all processes add up
+        """
+        cache = cls.get_stats_cache()
+        key = cls.get_stats_key(stat)
+        with cls._stats_lock:
+            for _ in range(cls.STATS_INCR_ATTEMPTS):
+                try:
+                    cache.incr(key)
+                    return
+                except ValueError:
+                    # the key does not exist yet, unless another process adds it first
+                    if cache.add(key, 1, timeout=None):
+                        return
+        logger.warning(f"Failed to count BAG geosearch cache {stat}")
+
+    @classmethod
+    def get_cache_stats(cls):
+        """
+        :return: dict with the number of cache hits and misses of all processes
+        """
+        keys = {cls.get_stats_key(stat): stat for stat in cls.CACHE_STATS}
+        values = cls.get_stats_cache().get_many(keys)
+        return {stat: values.get(key, 0) for key, stat in keys.items()}
+
+    @classmethod
+    def reset_cache_stats(cls):
+        cls.get_stats_cache().delete_many([cls.get_stats_key(stat) for stat in cls.CACHE_STATS])
+
     def get_stadsdeel(self, lat, lon):
+        """
+        Cached lookup of the stadsdeel. Points outside of Amsterdam (Geen) are cached with
+        BAG_GEO_SEARCH_CACHE_NEGATIVE_TIMEOUT, errors (BagFout) are not cached at all.
+        """
+        cache = self.get_cache()
+        key = self.get_cache_key(lat, lon)
+
+        stadsdeel = cache.get(key)
+        if stadsdeel is not None:
+            self.count("hits")
+            return stadsdeel
+        self.count("misses")
+
+        stadsdeel = self.fetch_stadsdeel(lat, lon)
+        if stadsdeel == Spot.Stadsdelen.Geen:
+            cache.set(key, stadsdeel, timeout=settings.BAG_GEO_SEARCH_CACHE_NEGATIVE_TIMEOUT)
+        elif stadsdeel is not None and stadsdeel != Spot.Stadsdelen.BagFout:
+            cache.set(key, stadsdeel)
+        return stadsdeel
+
+    def fetch_stadsdeel(self, lat, lon):
         url = settings.BAG_GEO_SEARCH_API_URL
 
         try:
-            response = requests.get(url, params={'lon': lon, 'lat': lat})
+            response = requests.get(url, params={'lon': lon, 'lat': lat}, timeout=settings.BAG_GEO_SEARCH_API_TIMEOUT)
             response.raise_for_status()
             content = response.json()
             features = content.get('features', [])
@@ -0,0 +1,377 @@
+import io
+import json
+import queue
+import threading
+from contextlib import contextmanager
+from itertools import islice
+
+import pyarrow
+import pyarrow.parquet
+from django.conf import settings
+from django.contrib.gis.db.models.functions import AsWKT
+from django.core.exceptions import EmptyResultSet
+from django.db import connection
+from django.db.models import Case, CharField, F, FloatField, Func, IntegerField, TextField, Value, When
+from django.db.models.functions import NullIf
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+from api.geojson import COORDINATE_PRECISION
+from api.renderers import StreamingCSVRenderer
+from api.serializers import SpotCSVSerializer
+from datasets.blackspots.models import Spot
+
+# number of rows fetched from the database at a time
+FETCH_SIZE = 500
+# size of the chunks of the csv written by COPY
+COPY_CHUNK_SIZE = 64 * 1024
+# number of chunks of the csv written by COPY that can wait to be sent to the client
+COPY_QUEUE_SIZE = 16
+# number of rows per row group of a parquet export
+PARQUET_ROW_GROUP_SIZE = 10000
+
+# record separator preceding every feature of a GeoJSON text sequence, see RFC 8142
+RECORD_SEPARATOR = '\x1e'
+
+
+def get_csv_columns():
+    """
+    The column or expression per field of SpotCSVSerializer, with the labels of choice fields.
+    :return: list of tuples of the field name, column and the labels by choice value or None
+    """
+    spot_fields = {field.name: field for field in Spot._meta.concrete_fields}
+    columns = []
+    for name, field in SpotCSVSerializer().fields.items():
+        if name == 'latitude':
+            columns.append((name, Func('point', function='ST_Y', output_field=FloatField()), None))
+        elif name == 'longitude':
+            columns.append((name, Func('point', function='ST_X', output_field=FloatField()), None))
+        elif field.source.startswith('get_') and field.source.endswith('_display'):
+            column = field.source[len('get_'):-len('_display')]
+            labels = {value: str(label) for value, label in spot_fields[column].flatchoices}
+            columns.append((name, column, labels))
+        else:
+            columns.append((name, field.source, None))
+    return columns
+
+
+def get_export_columns():
+    """
+    The columns of the csv export, followed by the wegvak as WKT, for the export formats which are not csv
+    """
+    return get_csv_columns() + [('wegvak', AsWKT('wegvak'), None)]
+
+
+@contextmanager
+def extra_float_digits():
+    """
+    Postgres < 12 rounds double precision values, like coordinates from ST_X and ST_Y, to 15 significant
+    digits unless extra digits are asked for. The setting is reset afterwards, so it does not change the
+    connection for other queries. It is not local to a transaction, because a streamed export must not
+    keep a transaction open: in autocommit the rows are fetched with a WITH HOLD cursor.
+    """
+    connection.ensure_connection()
+    if connection.pg_version >= 120000:
+        yield
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute('SET extra_float_digits = 3')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute('RESET extra_float_digits')
+
+
+def iter_csv_rows(queryset, columns=None):
+    """
+    Generate the rows of the spots in queryset, as lists of values in the order of the fields of
+    SpotCSVSerializer, with the same values as the serializer gives.
+    :param columns: the columns to use instead of those of the csv export, like get_csv_columns gives them
+    """
+    columns = columns or get_csv_columns()
+    annotations = {f'csv_{name}': column for name, column, _ in columns if not isinstance(column, str)}
+    values = [column if isinstance(column, str) else f'csv_{name}' for name, column, _ in columns]
+    label_columns = [(idx, labels) for idx, (_, _, labels) in enumerate(columns) if labels is not None]
+
+    with extra_float_digits():
+        rows = queryset.annotate(**annotations).values_list(*values).iterator(chunk_size=FETCH_SIZE)
+        for row in rows:
+            row = list(row)
+            for idx, labels in label_columns:
+                # like get_FOO_display, the value itself is used if it is not a choice
+                row[idx] = labels.get(row[idx], row[idx])
+            yield row
+
+
+class FloatText(Func):
+    """
+    Text of a double precision coordinate like Python's repr of the float, which has a .0 suffix for integral values
+    """
+    template = "CASE WHEN %(expressions)s = trunc(%(expressions)s) THEN %(expressions)s::text || '.0' " \
+               "ELSE %(expressions)s::text END"
+    output_field = CharField()
+
+
+def is_copy_enabled() -> bool:
+    """
+    Postgres 12 and later write double precision values in the shortest exact form, like Python does,
+    so only these can write the same csv as iter_csv_rows.
+    """
+    return settings.EXPORT_COPY_ENABLED and connection.vendor == 'postgresql' and connection.pg_version >= 120000
+
+
+def get_copy_sql(queryset):
+    """
+    COPY statement writing the csv rows of the spots in queryset, with the same values and quoting as rendering
+    iter_csv_rows with the StreamingCSVRenderer, except for the \\r\\n line terminators.
+    :return: the statement, or None if the queryset can not match any spot
+    """
+    spot_fields = {field.name: field for field in Spot._meta.concrete_fields}
+    expressions = {}
+    for name, column, labels in get_csv_columns():
+        if not isinstance(column, str):
+            expressions[f'csv_{name}'] = FloatText(column)
+            continue
+
+        if labels is not None:
+            whens = [When(**{column: value}, then=Value(label)) for value, label in labels.items()]
+            expression = Case(*whens, default=F(column), output_field=CharField())
+        else:
+            expression = F(column)
+        if labels is not None or isinstance(spot_fields[column], (CharField, TextField)):
+            # COPY quotes empty strings to tell them apart from nulls, the csv writer writes nothing for both
+            expression = NullIf(expression, Value(''))
+        expressions[f'csv_{name}'] = expression
+
+    try:
+        sql, params = queryset.annotate(**expressions).values_list(*expressions).query.sql_with_params()
+    except EmptyResultSet:
+        return None
+    # COPY does not take parameters
+    with connection.cursor() as cursor:
+        select = cursor.mogrify(sql, params).decode('utf-8')
+    return f"COPY ({select}) TO STDOUT WITH (FORMAT csv, DELIMITER ';')"
+
+
+class CopyWriter:
+    """
+    File object for copy_expert, putting the output of COPY in a queue in chunks of about COPY_CHUNK_SIZE bytes.
+    Once cancelled, the output is discarded.
+    """
+
+    def __init__(self, chunks: queue.Queue, cancelled: threading.Event):
+        self.chunks = chunks
+        self.cancelled = cancelled
+        self.buffer = []
+        self.size = 0
+
+    def write(self, data: bytes):
+        if self.cancelled.is_set():
+            return
+        self.buffer.append(data)
+        self.size += len(data)
+        if self.size >= COPY_CHUNK_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.put(b''.join(self.buffer))
+            self.buffer = []
+            self.size = 0
+
+    def put(self, item):
+        # the queue is bounded, so a slow client holds up the COPY instead of filling the memory
+        while not self.cancelled.is_set():
+            try:
+                self.chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+
+def copy_to_queue(raw_connection, copy_sql: str, writer: CopyWriter):
+    """
+    Run COPY, followed by None in the queue when done, or by the exception if it failed
+    """
+    try:
+        with raw_connection.cursor() as cursor:
+            cursor.copy_expert(copy_sql, writer)
+        writer.flush()
+        writer.put(None)
+    except Exception as e:
+        writer.put(e)
+
+
+def use_crlf(chunk: bytes, in_quotes: bool):
+    """
+    Replace the \\n line terminators of csv written by COPY with the \\r\\n the csv writer uses.
+    Newlines within quoted values are kept. Quotes within values are doubled, so a line ends
+    within quotes if it has an odd number of quotes.
+    :return: tuple of the converted chunk, and whether the chunk ends within quotes
+    """
+    lines = chunk.split(b'\n')
+    converted = [lines[0]]
+    in_quotes ^= lines[0].count(b'"') % 2 == 1
+    for line in lines[1:]:
+        converted.append(b'\n' if in_quotes else b'\r\n')
+        converted.append(line)
+        in_quotes ^= line.count(b'"') % 2 == 1
+    return b''.join(converted), in_quotes
+
+
+def iter_copy_csv(copy_sql, fieldnames):
+    """
+    Generate the csv export written by the database with COPY, preceded by the header.
+    psycopg2 only writes the output of COPY to a file object, so COPY runs in a thread
+    which passes the output on through a bounded queue.
+    """
+    yield from (chunk.encode('utf-8') for chunk in StreamingCSVRenderer().render_rows([], fieldnames))
+    if copy_sql is None:
+        return
+
+    connection.ensure_connection()
+    raw_connection = connection.connection
+    chunks = queue.Queue(maxsize=COPY_QUEUE_SIZE)
+    cancelled = threading.Event()
+    thread = threading.Thread(
+        target=copy_to_queue, args=(raw_connection, copy_sql, CopyWriter(chunks, cancelled)), daemon=True)
+    thread.start()
+
+    finished = False
+    try:
+        in_quotes = False
+        while True:
+            chunk = chunks.get()
+            if chunk is None or isinstance(chunk, Exception):
+                finished = True
+                if chunk is None:
+                    return
+                raise chunk
+            chunk, in_quotes = use_crlf(chunk, in_quotes)
+            yield chunk
+    finally:
+        if not finished:
+            # the client is gone, so stop the COPY
+            cancelled.set()
+            raw_connection.cancel()
+        thread.join()
+
+
+def write_xlsx(queryset, file):
+    """
+    Write the spots in queryset as an xlsx workbook with the columns of get_export_columns.
+    The workbook is write only, so the rows are written to a temporary file instead of held in memory.
+    """
+    columns = get_export_columns()
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('spots')
+    sheet.append([name for name, _, _ in columns])
+    for row in iter_csv_rows(queryset, columns):
+        sheet.append([get_xlsx_value(sheet, value) for value in row])
+    workbook.save(file)
+
+
+def get_xlsx_value(sheet, value):
+    if not isinstance(value, str):
+        return value
+    value = ILLEGAL_CHARACTERS_RE.sub('', value)
+    if value.startswith('='):
+        # openpyxl writes strings starting with = as formulas
+        cell = WriteOnlyCell(sheet, value)
+        cell.data_type = 's'
+        return cell
+    return value
+
+
+def iter_geojsonseq(queryset):
+    """
+    Generate the spots in queryset as a GeoJSON text sequence, with the columns of the csv export as
+    properties. The geometry is the point, so every feature has a simple geometry that GIS tools can read
+    as one layer. The wegvak, if the spot has one, is the GeoJSON LineString in the wegvak property.
+    """
+    columns = get_csv_columns()
+    names = [name for name, _, _ in columns]
+    extra_columns = [('geometry', as_geojson('point'), None), ('wegvak', as_geojson('wegvak'), None)]
+
+    rows = iter_csv_rows(queryset, columns + extra_columns)
+    while True:
+        batch = list(islice(rows, FETCH_SIZE))
+        if not batch:
+            return
+        yield ''.join(get_geojsonseq_record(names, row) for row in batch)
+
+
+def as_geojson(column):
+    return Func(column, Value(COORDINATE_PRECISION), Value(0), function='ST_AsGeoJSON', output_field=TextField())
+
+
+def get_geojsonseq_record(names, row):
+    """
+    :param row: the values of the columns in names, followed by the point and the wegvak as GeoJSON
+    """
+    *values, point, wegvak = row
+    properties = json.dumps(dict(zip(names, values)), ensure_ascii=False, separators=(',', ':'))
+    # the wegvak is GeoJSON already, so it is added to the properties as it is
+    return f'{RECORD_SEPARATOR}{{"type":"Feature","geometry":{point},' \
+           f'"properties":{properties[:-1]},"wegvak":{wegvak or "null"}}}}}\n'
+
+
+class ParquetSink(io.RawIOBase):
+    """
+    File object collecting what the parquet writer writes, until it is taken by the response
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.buffer = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.buffer.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self) -> bytes:
+        data = b''.join(self.buffer)
+        self.buffer = []
+        return data
+
+
+def get_arrow_type(column):
+    if isinstance(column, str):
+        field = Spot._meta.get_field(column)
+        return pyarrow.int64() if isinstance(field, IntegerField) else pyarrow.string()
+    return pyarrow.float64() if isinstance(column.output_field, FloatField) else pyarrow.string()
+
+
+def iter_parquet(queryset):
+    """
+    Generate the spots in queryset as a parquet file with the columns of get_export_columns,
+    written a row group of PARQUET_ROW_GROUP_SIZE rows at a time.
+    """
+    columns = get_export_columns()
+    schema = pyarrow.schema([(name, get_arrow_type(column)) for name, column, _ in columns])
+    sink = ParquetSink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema)
+
+    rows = iter_csv_rows(queryset, columns)
+    while True:
+        batch = list(islice(rows, PARQUET_ROW_GROUP_SIZE))
+        if not batch:
+            break
+        arrays = [pyarrow.array(values, type=field.type) for values, field in zip(zip(*batch), schema)]
+        writer.write_table(pyarrow.Table.from_arrays(arrays, schema=schema))
+        yield sink.take()
+
+    # the footer with the metadata is written on close
+    writer.close()
+    yield sink.take()
@@ -0,0 +1,64 @@
+import math
+
+from django.contrib.gis.geos import Point, Polygon
+from django.contrib.gis.measure import D
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+# meters per degree of latitude
+METERS_PER_DEGREE = 111320
+
+
+def parse_floats(name, value, count):
+    try:
+        floats = [float(part) for part in value.split(',')]
+    except ValueError:
+        floats = []
+    if len(floats) != count or not all(math.isfinite(number) for number in floats):
+        raise ValidationError({name: [_('Expected {count} comma separated numbers').format(count=count)]})
+    return floats
+
+
+class SpotSpatialFilter(BaseFilterBackend):
+    """
+    Filter spots on location, using the spatial indexes on point and wegvak:
+
+    * bbox=min_lon,min_lat,max_lon,max_lat: spots of which the point or wegvak overlaps the box
+    * near=lat,lon&radius=meters: spots of which the point lies within radius of the location
+    """
+    query_params = ('bbox', 'near', 'radius')
+
+    def filter_queryset(self, request, queryset, view):
+        if 'bbox' in request.query_params:
+            queryset = queryset.filter(self.get_bbox_filter(request.query_params['bbox']))
+
+        if 'near' in request.query_params:
+            lat, lon = parse_floats('near', request.query_params['near'], count=2)
+            if 'radius' not in request.query_params:
+                raise ValidationError({'radius': [_('radius is required with near')]})
+            radius, = parse_floats('radius', request.query_params['radius'], count=1)
+            if radius < 0:
+                raise ValidationError({'radius': [_('radius must be positive')]})
+
+            # the bounding box of the circle selects candidates through the index,
+            # the distance is only calculated for those
+            center = Point(lon, lat, srid=4326)
+            dlat = radius / METERS_PER_DEGREE
+            dlon = dlat / max(math.cos(math.radians(lat)), 0.01)
+            bbox = Polygon.from_bbox((lon - dlon, lat - dlat, lon + dlon, lat + dlat))
+            bbox.srid = 4326
+            queryset = queryset.filter(point__bboverlaps=bbox, point__distance_lte=(center, D(m=radius)))
+
+        return queryset
+
+    @staticmethod
+    def get_bbox_filter(value):
+        min_lon, min_lat, max_lon, max_lat = parse_floats('bbox', value, count=4)
+        if min_lon > max_lon or min_lat > max_lat:
+            raise ValidationError({'bbox': [_('Expected min_lon,min_lat,max_lon,max_lat')]})
+
+        bbox = Polygon.from_bbox((min_lon, min_lat, max_lon, max_lat))
+        bbox.srid = 4326
+        return Q(point__bboverlaps=bbox) | Q(wegvak__bboverlaps=bbox)
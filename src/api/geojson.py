@@ -0,0 +1,159 @@
+from django.contrib.gis.db.models import GeometryField
+from django.core.exceptions import EmptyResultSet
+from django.db import connection, models
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from rest_framework.reverse import reverse
+
+from api.serializers import SpotGeojsonSerializer
+from datasets.blackspots.models import Document, Spot
+
+# number of features fetched from the database at a time
+FETCH_SIZE = 500
+# maximum number of decimals of coordinates, PostGIS prints at most 15 significant digits
+COORDINATE_PRECISION = 15
+
+URL_PLACEHOLDER = 'document_pk'
+
+
+def json_value(expression: str, field) -> str:
+    """
+    SQL expression rendering the value of a model field as compact json text.
+    """
+    if isinstance(field, GeometryField):
+        value = f"ST_AsGeoJSON({expression}, {COORDINATE_PRECISION}, 0)"
+    elif isinstance(field, (models.IntegerField, models.AutoField)):
+        value = f"{expression}::text"
+    elif isinstance(field, (models.CharField, models.TextField)):
+        value = f"to_json({expression})::text"
+    else:
+        raise ValueError(f"No json representation for {field.name}")
+    return f"COALESCE({value}, 'null')"
+
+
+def json_object(members) -> str:
+    """
+    SQL expression concatenating (key, SQL expression) members into a compact json object.
+    json_build_object is not used, because it separates keys and values with spaces.
+    """
+    parts = ["'{' || "]
+    for idx, (key, expression) in enumerate(members):
+        separator = ',' if idx else ''
+        parts.append(f"'{separator}\"{key}\":' || {expression} || ")
+    parts.append("'}'")
+    return ''.join(parts)
+
+
+def quote(value) -> str:
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def display_value(column: str, choices) -> str:
+    """
+    SQL expression rendering the display value of a choices column, like get_FOO_display.
+    """
+    cases = ' '.join(f"WHEN {quote(value)} THEN {quote(label)}" for value, label in choices)
+    return f"to_json(CASE {column} {cases} ELSE {column} END)::text"
+
+
+def get_documents_sql() -> str:
+    """
+    SQL expression rendering the documents of spot s like SpotDocumentSerializer.
+    The link to the document is the url prefix, its id and the url suffix, given as parameters.
+    """
+    document_fields = {field.name: field for field in Document._meta.concrete_fields}
+    document = json_object([
+        ('_links', json_object([('self', json_object([('href', "to_json(%s || d.id::text || %s)::text")]))])),
+        ('_display', json_value('d.filename', document_fields['filename'])),
+        ('id', json_value('d.id', document_fields['id'])),
+        ('type', json_value('d.type', document_fields['type'])),
+        ('filename', json_value('d.filename', document_fields['filename'])),
+    ])
+    return (
+        f"COALESCE((SELECT '[' || string_agg({document}, ',' ORDER BY d.id) || ']' "
+        f"FROM {Document._meta.db_table} d WHERE d.spot_id = s.id), '[]')"
+    )
+
+
+def get_feature_sql() -> str:
+    """
+    SQL expression rendering spot s as a feature like SpotGeojsonSerializer,
+    with the properties in the order of the serializer fields.
+    """
+    serializer = SpotGeojsonSerializer()
+    meta = serializer.Meta
+    spot_fields = {field.name: field for field in Spot._meta.concrete_fields}
+
+    properties = []
+    for name in serializer.fields:
+        if name in ('id', meta.geo_field):
+            continue
+        if name == 'stadsdeel':
+            expression = display_value('s.stadsdeel', Spot.Stadsdelen.choices)
+        elif name == 'documents':
+            expression = get_documents_sql()
+        else:
+            expression = json_value(f's.{name}', spot_fields[name])
+        properties.append((name, expression))
+
+    return json_object([
+        ('id', json_value('s.id', spot_fields['id'])),
+        ('type', "'\"Feature\"'"),
+        ('geometry', json_value(f's.{meta.geo_field}', spot_fields[meta.geo_field])),
+        ('properties', json_object(properties)),
+    ])
+
+
+def get_order_by(queryset):
+    """
+    Order expressions of queryset, followed by the primary key so the order is unique.
+    """
+    order_by = []
+    for term in queryset.query.order_by:
+        if isinstance(term, str):
+            expression = F(term.lstrip('-'))
+            term = expression.desc() if term.startswith('-') else expression.asc()
+        order_by.append(term)
+    order_by.append(F('pk').asc())
+    return order_by
+
+
+def iter_geojson(queryset, request):
+    """
+    Generate the geojson FeatureCollection of the spots in queryset, built by the database.
+
+    The output is identical to rendering SpotGeojsonSerializer with the JSONRenderer, except
+    for coordinates which need more than 15 significant digits to be represented exactly,
+    these are rounded by PostGIS.
+    """
+    document_url = reverse('document-detail', kwargs={'pk': URL_PLACEHOLDER}, request=request)
+    url_prefix, url_suffix = document_url.split(URL_PLACEHOLDER)
+
+    # the position of each spot in the ordering of the queryset, like ?ordering= sets it
+    spot_ids = queryset.annotate(row_idx=Window(RowNumber(), order_by=get_order_by(queryset)))
+    try:
+        spot_ids_sql, spot_ids_params = spot_ids.order_by().values_list('pk', 'row_idx').query.sql_with_params()
+    except EmptyResultSet:
+        yield '{"type":"FeatureCollection","features":[]}'
+        return
+
+    sql = (
+        f"SELECT {get_feature_sql()} FROM {Spot._meta.db_table} s "
+        f"JOIN ({spot_ids_sql}) o ON o.id = s.id ORDER BY o.row_idx"
+    )
+
+    yield '{"type":"FeatureCollection","features":['
+    # a server side cursor, so the features are not all loaded in memory at once
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(sql, [url_prefix, url_suffix, *spot_ids_params])
+        separator = ''
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            features = ','.join(row[0] for row in rows)
+            # the JSONRenderer escapes these line terminators, to_json does not
+            features = features.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029')
+            yield separator + features
+            separator = ','
+    yield ']}'
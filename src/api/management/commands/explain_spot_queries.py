@@ -0,0 +1,128 @@
+import re
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.filters import SpotSpatialFilter
+from api.views import SpotExportViewSet, SpotViewSet
+from datasets.blackspots.models import Spot
+
+DEFAULT_COUNT = 100000
+
+
+class Command(BaseCommand):
+    help = 'Show the query plans of the spot export and list queries on a synthetic table of spots, and fail ' \
+           'when a plan does not use the expected indexes. The synthetic spots are created in a transaction ' \
+           'that is rolled back afterwards.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--count',
+            type=int,
+            default=DEFAULT_COUNT,
+            help='Number of synthetic spots',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            unused = self.explain_queries(options['count'])
+        finally:
+            # ANALYZE is not undone by the rollback, so the statistics must describe the real spots again
+            analyze_spots()
+
+        if unused:
+            raise CommandError(f'The expected indexes are not used by: {"; ".join(unused)}')
+
+    def explain_queries(self, count):
+        """
+        :return: names of the queries that do not use the expected indexes
+        """
+        with transaction.atomic():
+            create_synthetic_spots(count)
+            analyze_spots()
+
+            unused = []
+            for name, queryset, indexes in get_queries():
+                plan = queryset.explain(analyze=True)
+                missing = [index for index in indexes if not uses_index(plan, index)]
+                if missing:
+                    unused.append(name)
+                    self.stdout.write(f'{name}: NOT USING {", ".join(missing)}')
+                elif indexes:
+                    self.stdout.write(f'{name}: using {", ".join(indexes)}')
+                else:
+                    self.stdout.write(f'{name}:')
+                self.stdout.write(plan)
+                self.stdout.write('')
+
+            transaction.set_rollback(True)
+
+        return unused
+
+
+def uses_index(plan: str, index: str) -> bool:
+    return re.search(rf'\b{re.escape(index)}\b', plan) is not None
+
+
+def analyze_spots():
+    with connection.cursor() as cursor:
+        cursor.execute(f'ANALYZE {Spot._meta.db_table}')
+
+
+def create_synthetic_spots(count):
+    """
+    Insert count spots, with the choice fields evenly distributed over their choices
+    and points spread over Amsterdam.
+    """
+    sql = f"""
+        INSERT INTO {Spot._meta.db_table} (
+            locatie_id, spot_type, description, point, stadsdeel, status, actiehouders
+        )
+        SELECT
+            'synth_' || i,
+            (%(spot_types)s::text[])[1 + mod(i, cardinality(%(spot_types)s::text[]))],
+            'Synthetic spot ' || i,
+            ST_SetSRID(ST_MakePoint(4.75 + random() * 0.3, 52.28 + random() * 0.15), 4326),
+            (%(stadsdelen)s::text[])[1 + mod(i / 7, cardinality(%(stadsdelen)s::text[]))],
+            (%(statuses)s::text[])[1 + mod(i / 3, cardinality(%(statuses)s::text[]))],
+            'Synthetic'
+        FROM generate_series(1, %(count)s) AS i
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {
+            'count': count,
+            'spot_types': list(Spot.SpotType.values),
+            'stadsdelen': list(Spot.Stadsdelen.values),
+            'statuses': list(Spot.StatusChoice.values),
+        })
+
+
+def get_queries():
+    """
+    :return: list of (name, queryset, names of the indexes the plan should use) for the access paths
+    of the export and the list, with the indexes of migrations 0019 and 0020. The export is ordered
+    by stadsdeel and spot_type, so its spot_type and status filters are only shown, the spot_type_idx
+    and spot_status_idx indexes are there for the pages of the list.
+    """
+    page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    export = SpotExportViewSet.queryset
+    spots = SpotViewSet.queryset
+    bbox = SpotSpatialFilter.get_bbox_filter('4.89,52.37,4.91,52.38')
+    near = SpotSpatialFilter().filter_queryset(
+        SimpleNamespace(query_params={'near': '52.3731,4.8932', 'radius': '500'}), spots, view=None)
+    return [
+        ('export, stadsdeel filter', export.filter(stadsdeel=Spot.Stadsdelen.Centrum),
+         ['spot_stadsdeel_type_idx']),
+        ('export, stadsdeel and spot_type filter', export.filter(
+            stadsdeel=Spot.Stadsdelen.Centrum, spot_type=Spot.SpotType.blackspot), ['spot_stadsdeel_type_idx']),
+        ('export, spot_type filter', export.filter(spot_type=Spot.SpotType.blackspot), []),
+        ('export, status filter', export.filter(status=Spot.StatusChoice.gereed), []),
+        ('list, first page', spots[:page_size], ['blackspots_spot_pkey']),
+        ('list, spot_type filter', spots.filter(spot_type=Spot.SpotType.blackspot)[:page_size], ['spot_type_idx']),
+        ('list, status filter', spots.filter(status=Spot.StatusChoice.gereed)[:page_size], ['spot_status_idx']),
+        ('list, bbox filter', spots.filter(bbox)[:page_size],
+         ['blackspots_spot_point_id', 'blackspots_spot_wegvak_id']),
+        ('list, near filter', near[:page_size], ['blackspots_spot_point_id']),
+    ]
@@ -0,0 +1,59 @@
+import json
+import logging
+
+from django.contrib.gis.geos import GEOSGeometry, MultiPolygon, Polygon
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from datasets.blackspots.models import Spot, Stadsdeel
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Import the stadsdeel boundaries used to determine the stadsdeel of a spot ' \
+           'from a GeoJSON FeatureCollection, with a "code" and "naam" property per feature'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to the GeoJSON file')
+        parser.add_argument('--srid', type=int, default=4326, help='Spatial reference system of the geometries')
+
+    def handle(self, *args, **options):
+        import_stadsdelen(options['path'], srid=options['srid'])
+
+
+def get_multipolygon(geometry: dict, srid: int) -> MultiPolygon:
+    geometry = GEOSGeometry(json.dumps(geometry))
+    # the srid of a GeoJSON geometry is not part of the geometry itself
+    geometry.srid = srid
+    if srid != 4326:
+        geometry.transform(4326)
+    if isinstance(geometry, Polygon):
+        geometry = MultiPolygon(geometry, srid=4326)
+    return geometry
+
+
+def import_stadsdelen(path, srid=4326):
+    with open(path) as file:
+        feature_collection = json.load(file)
+
+    stadsdeel_names = dict(Spot.Stadsdelen.choices)
+    stadsdelen = []
+    for feature in feature_collection.get('features', []):
+        properties = feature.get('properties', {})
+        code = properties.get('code')
+        if code not in stadsdeel_names:
+            logger.error(f"Unknown stadsdeel code: {code}, skipping")
+            continue
+
+        stadsdelen.append(Stadsdeel(
+            code=code,
+            naam=properties.get('naam') or stadsdeel_names[code],
+            geometrie=get_multipolygon(feature.get('geometry'), srid),
+        ))
+
+    with transaction.atomic():
+        Stadsdeel.objects.all().delete()
+        Stadsdeel.objects.bulk_create(stadsdelen)
+
+    logger.info(f"Imported {len(stadsdelen)} stadsdelen")
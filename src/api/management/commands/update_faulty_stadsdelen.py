@@ -1,33 +1,75 @@
 import logging
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 from django.core.management.base import BaseCommand
 
 from api.bag_geosearch import BagGeoSearchAPI
-from datasets.blackspots.models import Spot
+from api.stadsdeel_resolver import StadsdeelResolver
+from datasets.blackspots.models import DataVersion, Spot
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_WORKERS = 8
+
 
 class Command(BaseCommand):
     help = 'Try to determine the stadsdeel for each Spot where stadsdeel ' \
            'is unknown due to earlier connection errors'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=DEFAULT_WORKERS,
+            help='Maximum number of concurrent requests to the BAG geosearch API',
+        )
+
     def handle(self, *args, **options):
-        spots = Spot.objects.filter(stadsdeel=Spot.Stadsdelen.BagFout)
-        bag_geosearch_api = BagGeoSearchAPI()
+        spots = list(Spot.objects.filter(stadsdeel=Spot.Stadsdelen.BagFout))
+        stadsdelen = resolve_stadsdelen(spots, workers=options['workers'])
+
         update_dict = defaultdict(int)
-        for spot in spots:
-            lat = spot.point.y
-            lon = spot.point.x
-            stadsdeel = bag_geosearch_api.get_stadsdeel(lat=lat, lon=lon)
+        updated_spots = []
+        for spot, stadsdeel in zip(spots, stadsdelen):
             if stadsdeel != spot.stadsdeel:
                 spot.stadsdeel = stadsdeel
-                spot.save()
+                updated_spots.append(spot)
 
             update_dict[stadsdeel] += 1
 
+        Spot.objects.bulk_update(updated_spots, ['stadsdeel'])
+        if updated_spots:
+            DataVersion.bump()
+
         for stadsdeel in update_dict:
             logger.info(f"Updated {update_dict[stadsdeel]} Spots to {stadsdeel}")
-        else:
+        if not updated_spots:
             logger.info("No Spots updated; all have correct stadsdeel")
+
+        logger.info(f"BAG geosearch cache stats: {BagGeoSearchAPI.get_cache_stats()}")
+
+
+def resolve_stadsdelen(spots, workers=DEFAULT_WORKERS):
+    """
+    Determine the stadsdeel of each spot. Spots inside the local stadsdeel boundaries
+    are resolved directly, the others are looked up concurrently in the BAG geosearch API.
+    Only the local lookups use the database, so the worker threads don't open connections.
+    :return: list of stadsdelen, in the order of spots
+    """
+    resolver = StadsdeelResolver()
+    stadsdelen = [resolver.get_local_stadsdeel(lat=spot.point.y, lon=spot.point.x) for spot in spots]
+
+    missing = [idx for idx, stadsdeel in enumerate(stadsdelen) if stadsdeel is None]
+    if missing:
+        bag_geosearch_api = BagGeoSearchAPI()
+
+        def lookup(idx):
+            point = spots[idx].point
+            return bag_geosearch_api.get_stadsdeel(lat=point.y, lon=point.x)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for idx, stadsdeel in zip(missing, executor.map(lookup, missing)):
+                stadsdelen[idx] = stadsdeel
+
+    return stadsdelen
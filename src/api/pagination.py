@@ -0,0 +1,201 @@
+import json
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from urllib import parse
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class HALCursorPagination(CursorPagination):
+    """
+    Keyset pagination in the HAL envelope of datapunt_api's HALPagination.
+
+    The cursor holds the values of the ordering fields, with the primary key as tie breaker,
+    of the first or last item of a page. The next and previous page are found by seeking
+    past these values, so deep pages are as fast as the first page, given an index on the
+    ordering fields. The count of all items is included, unless the client passes count=false.
+    """
+    ordering = 'pk'
+    page_size_query_param = 'page_size'
+    max_page_size = settings.REST_FRAMEWORK['MAX_PAGINATE_BY']
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_seek_ordering(request, queryset, view)
+        self.fields = [self.get_field(queryset.model, term) for term in self.ordering]
+        self.count = None if self.is_count_disabled(request) else queryset.count()
+
+        reverse, position = self.decode_cursor(request) or (False, None)
+        queryset = queryset.order_by(*[order_by(term, reverse) for term in self.ordering])
+        if position is not None:
+            queryset = queryset.filter(self.get_seek_filter(position, reverse))
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_more = len(results) > self.page_size
+        if reverse:
+            self.page.reverse()
+            (self.has_next, self.has_previous) = (True, has_more)
+        else:
+            (self.has_next, self.has_previous) = (has_more, position is not None)
+
+        return self.page
+
+    def get_seek_ordering(self, request, queryset, view):
+        """
+        The ordering of the view, made unique by ordering on the primary key last.
+        """
+        ordering = self.get_ordering(request, queryset, view)
+        for term in ordering:
+            assert '__' not in term, 'Cursor pagination does not support ordering on related fields'
+
+        pk_name = queryset.model._meta.pk.name
+        if not any(term.lstrip('-') in ('pk', pk_name) for term in ordering):
+            ordering += ('pk',)
+        return ordering
+
+    def get_field(self, model, term):
+        name = term.lstrip('-')
+        if name == 'pk':
+            return model._meta.pk
+        try:
+            return model._meta.get_field(name)
+        except FieldDoesNotExist:
+            raise AssertionError(f'Cursor pagination can not order on {name}')
+
+    def is_count_disabled(self, request):
+        return request.query_params.get(self.count_query_param, '').lower() in ('false', '0')
+
+    def get_seek_filter(self, position, reverse):
+        """
+        Filter on the items after the position, in the ordering of the page:
+        (a > x) OR (a = x AND b > y) OR ..., with nulls sorted as the largest values.
+        The condition a >= x is added, so the database can do an index range scan on a.
+        """
+        seek = Q(pk__in=[])
+        equal = Q()
+        for term, field, value in zip(self.ordering, self.fields, position):
+            descending = term.startswith('-') != reverse
+            seek |= equal & after(field, value, descending)
+            equal &= equal_to(field, value)
+
+        first_field, first_value = self.fields[0], position[0]
+        descending = self.ordering[0].startswith('-') != reverse
+        return seek & (after(first_field, first_value, descending) | equal_to(first_field, first_value))
+
+    def get_position(self, instance):
+        return [getattr(instance, field.attname) for field in self.fields]
+
+    def decode_cursor(self, request):
+        """
+        :return: tuple of reverse and the position, or None if there is no cursor
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            tokens = parse.parse_qs(b64decode(encoded.encode('ascii')).decode('ascii'), keep_blank_values=True)
+            reverse = bool(int(tokens.get('r', ['0'])[0]))
+            position = json.loads(tokens['p'][0])
+            if not isinstance(position, list) or len(position) != len(self.fields):
+                raise ValueError
+            position = [None if value is None else field.to_python(value)
+                        for field, value in zip(self.fields, position)]
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+        return reverse, position
+
+    def encode_cursor(self, reverse, position):
+        tokens = {'p': json.dumps(position, separators=(',', ':'))}
+        if reverse:
+            tokens['r'] = '1'
+        encoded = b64encode(parse.urlencode(tokens).encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(False, self.get_position(self.page[-1]))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(True, self.get_position(self.page[0]))
+
+    def get_paginated_response(self, data):
+        self_link = self.request.build_absolute_uri()
+        if self_link.endswith(".api"):
+            self_link = self_link[:-4]
+
+        response = OrderedDict([
+            ('_links', OrderedDict([
+                ('self', dict(href=self_link)),
+                ('next', dict(href=self.get_next_link())),
+                ('previous', dict(href=self.get_previous_link())),
+            ])),
+        ])
+        if self.count is not None:
+            response['count'] = self.count
+        response['results'] = data
+        return Response(response)
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters.append({
+            'name': self.count_query_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Set to false to leave out the count of all results.',
+            'schema': {
+                'type': 'boolean',
+            },
+        })
+        return parameters
+
+
+def order_by(term: str, reverse: bool):
+    """
+    Order expression for an ordering term, with nulls sorted as the largest values like Postgres does.
+    """
+    descending = term.startswith('-') != reverse
+    if descending:
+        return F(term.lstrip('-')).desc(nulls_first=True)
+    return F(term.lstrip('-')).asc(nulls_last=True)
+
+
+def equal_to(field, value) -> Q:
+    if value is None:
+        return Q(**{f'{field.attname}__isnull': True})
+    return Q(**{field.attname: value})
+
+
+def after(field, value, descending: bool) -> Q:
+    """
+    Filter on the values of field that sort after value, with nulls sorted as the largest values.
+    """
+    if value is None:
+        # nothing sorts after null in ascending order, every other value does in descending order
+        return Q(**{f'{field.attname}__isnull': False}) if descending else Q(pk__in=[])
+    if descending:
+        return Q(**{f'{field.attname}__lt': value})
+    if field.null:
+        return Q(**{f'{field.attname}__gt': value}) | Q(**{f'{field.attname}__isnull': True})
+    return Q(**{f'{field.attname}__gt': value})
@@ -1,8 +1,14 @@
 import csv
+import io
+import json
+from itertools import islice
 
-from rest_framework.renderers import JSONRenderer
+from rest_framework.renderers import BaseRenderer, JSONRenderer
 from rest_framework_csv.misc import Echo
 
+# number of rows written to a streamed csv at a time
+CSV_BATCH_SIZE = 500
+
 
 class StreamingCSVRenderer:
 
@@ -13,9 +19,44 @@ class StreamingCSVRenderer:
         for obj in data:
             yield writer.writerow(obj)
 
+    def render_rows(self, rows, fieldnames, batch_size=CSV_BATCH_SIZE):
+        """
+        Render rows given as lists of values in the order of fieldnames, like render does for dicts.
+        The rows are written in batches, which is much faster than writing them one at a time.
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, dialect="excel", delimiter=";")
+        writer.writerow(fieldnames)
+
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, batch_size))
+            writer.writerows(batch)
+            yield buffer.getvalue()
+            if len(batch) < batch_size:
+                return
+            buffer.seek(0)
+            buffer.truncate()
+
 
 class GeojsonRenderer(JSONRenderer):
     """
     Simpy allows for ?format=geojson to be used to get a Json response
     """
     format = 'geojson'
+
+
+class MVTRenderer(BaseRenderer):
+    """
+    Renders Mapbox vector tiles, which are built by the database, and allows for the .pbf suffix
+    """
+    media_type = 'application/vnd.mapbox-vector-tile'
+    format = 'pbf'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, bytes):
+            return data
+        # errors, like authorization errors, are rendered as json
+        return json.dumps(data).encode('utf-8')
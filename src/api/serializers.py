@@ -1,21 +1,25 @@
 import logging
+from itertools import islice
 
 import six
 from datapunt_api.rest import HALSerializer
 from django.conf import settings
 from django.db import models
-from django.db.models import query
+from django.db.models import prefetch_related_objects, query
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 from rest_framework.serializers import ModelSerializer
 from rest_framework_gis.serializers import GeoFeatureModelSerializer
 
-from api.bag_geosearch import BagGeoSearchAPI
+from api.stadsdeel_resolver import StadsdeelResolver
 from datasets.blackspots.models import Document, Spot
 from storage.objectstore import ObjectStore
 
 logger = logging.getLogger(__name__)
 
+# number of objects fetched from the database at a time when serializing a queryset as a generator
+ITERATOR_CHUNK_SIZE = 500
+
 
 class DocumentSerializer(HALSerializer):
     spot = serializers.HyperlinkedRelatedField(
@@ -126,7 +130,7 @@ class SpotSerializer(HALSerializer):
     def determine_stadsdeel(self, point):
         lat = point.y
         lon = point.x
-        return BagGeoSearchAPI().get_stadsdeel(lat=lat, lon=lon)
+        return StadsdeelResolver().get_stadsdeel(lat=lat, lon=lon)
 
     def create(self, validated_data):
         rapport_file = validated_data.pop('rapport_document', None)
@@ -205,9 +209,9 @@ class GeneratorListSerializer(serializers.ListSerializer):
         # Use an iterator on the queryset to allow large querysets to be
         # exported without excessive memory usage
         if isinstance(data, models.Manager):
-            iterable = data.all().iterator()
+            iterable = iterate_queryset(data.all())
         elif isinstance(data, query.QuerySet):
-            iterable = data.iterator()
+            iterable = iterate_queryset(data)
         else:
             iterable = data
         # Return a generator rather than a list so that streaming responses
@@ -221,6 +225,25 @@ class GeneratorListSerializer(serializers.ListSerializer):
         return super(serializers.ListSerializer, self).data
 
 
+def iterate_queryset(queryset, chunk_size=ITERATOR_CHUNK_SIZE):
+    """
+    Iterate over a queryset in chunks, without caching the results. QuerySet.iterator ignores
+    prefetch_related, so the related objects are prefetched per chunk instead.
+    """
+    iterator = queryset.iterator(chunk_size=chunk_size)
+    lookups = queryset._prefetch_related_lookups
+    if not lookups:
+        yield from iterator
+        return
+
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        prefetch_related_objects(chunk, *lookups)
+        yield from chunk
+
+
 class SpotCSVSerializer(ModelSerializer):
     stadsdeel = serializers.CharField(source='get_stadsdeel_display')
     type = serializers.CharField(source='spot_type')
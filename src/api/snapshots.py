@@ -0,0 +1,56 @@
+import gzip
+import logging
+
+from django.core.cache import caches
+
+from datasets.blackspots.models import DataVersion
+
+logger = logging.getLogger(__name__)
+
+CACHE_NAME = "snapshots"
+# vector tiles have a cache of their own, so the many tiles can not push the geojson snapshot out
+TILES_CACHE_NAME = "tiles"
+
+
+def get_cache(cache_name=CACHE_NAME):
+    return caches[cache_name]
+
+
+def get_snapshot_etag(version: str) -> str:
+    return f'"{version}"'
+
+
+def get_snapshot(name: str, build_content, cache_name=CACHE_NAME, version=None):
+    """
+    Get data derived from all spots, which is built once per data version and stored
+    in a shared cache.
+    :param name: name of the snapshot, unique within a data version
+    :param build_content: function returning the content as bytes, called if there is no snapshot yet
+    :param cache_name: alias of the cache the snapshot is stored in
+    :param version: data version read before, the current data version by default
+    :return: tuple of the etag and the content
+    """
+    # the version is read before the content, so a snapshot is never older than its version
+    if version is None:
+        version = DataVersion.get_version()
+    key = f"{name}:{version}"
+
+    cache = get_cache(cache_name)
+    content = cache.get(key)
+    if content is None:
+        logger.debug(f"Building snapshot {name} for version {version}")
+        content = build_content()
+        cache.set(key, content)
+
+    return get_snapshot_etag(version), content
+
+
+def get_geojson_snapshot(base_url: str, build_content, version=None):
+    """
+    Get the gzipped geojson of all spots.
+    :param base_url: the geojson contains absolute links, so a snapshot is stored per base url
+    :param build_content: function returning the geojson as bytes
+    :param version: data version read before, the current data version by default
+    :return: tuple of the etag and the gzipped geojson
+    """
+    return get_snapshot(f"geojson:{base_url}", lambda: gzip.compress(build_content()), version=version)
@@ -0,0 +1,62 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.gis.geos import Point
+
+from api.bag_geosearch import BagGeoSearchAPI
+from datasets.blackspots.models import Stadsdeel
+
+logger = logging.getLogger(__name__)
+
+
+class StadsdeelResolver:
+    """
+    Determines the stadsdeel of a point in-process, using the stadsdeel
+    boundaries in the database. Falls back to the BAG geosearch API when
+    no boundary contains the point.
+
+    The boundaries are loaded per thread as prepared geometries, together
+    with their bounding boxes, and reloaded after STADSDEEL_BOUNDARIES_TTL
+    seconds. With only a handful of stadsdelen the bounding box check is all
+    the spatial indexing that is needed.
+    """
+
+    # GEOS prepared geometries are not safe to share between threads
+    _local = threading.local()
+
+    @classmethod
+    def reset(cls):
+        """
+        Reload the boundaries of the current thread on the next lookup
+        """
+        cls._local.loaded_at = None
+
+    @classmethod
+    def get_boundaries(cls):
+        loaded_at = getattr(cls._local, 'loaded_at', None)
+        if loaded_at is None or time.monotonic() - loaded_at > settings.STADSDEEL_BOUNDARIES_TTL:
+            cls._local.boundaries = [
+                (stadsdeel.geometrie.extent, stadsdeel.geometrie.prepared, stadsdeel.code)
+                for stadsdeel in Stadsdeel.objects.all()
+            ]
+            cls._local.loaded_at = time.monotonic()
+            logger.info(f"Loaded {len(cls._local.boundaries)} stadsdeel boundaries")
+        return cls._local.boundaries
+
+    def get_local_stadsdeel(self, lat, lon):
+        """
+        :return: the code of the stadsdeel containing the point, or None if no boundary contains it
+        """
+        point = Point(lon, lat, srid=4326)
+        for (xmin, ymin, xmax, ymax), prepared, code in self.get_boundaries():
+            if xmin <= lon <= xmax and ymin <= lat <= ymax and prepared.covers(point):
+                return code
+        return None
+
+    def get_stadsdeel(self, lat, lon):
+        stadsdeel = self.get_local_stadsdeel(lat=lat, lon=lon)
+        if stadsdeel is None:
+            stadsdeel = BagGeoSearchAPI().get_stadsdeel(lat=lat, lon=lon)
+        return stadsdeel
@@ -0,0 +1,63 @@
+from django.core.exceptions import EmptyResultSet
+from django.db import connection
+
+from datasets.blackspots.models import Spot
+
+# half the width of the web mercator (EPSG:3857) world, in meters
+WEB_MERCATOR_MAX = 20037508.342789244
+MAX_ZOOM = 22
+# size of a tile in tile coordinates, and the buffer around it for geometries crossing its edge
+TILE_EXTENT = 4096
+TILE_BUFFER = 256
+
+
+def is_valid_tile(z: int, x: int, y: int) -> bool:
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def get_tile_bounds(z: int, x: int, y: int):
+    """
+    :return: (xmin, ymin, xmax, ymax) of the tile in web mercator
+    """
+    size = 2 * WEB_MERCATOR_MAX / 2 ** z
+    xmin = -WEB_MERCATOR_MAX + x * size
+    ymax = WEB_MERCATOR_MAX - y * size
+    return xmin, ymax - size, xmin + size, ymax
+
+
+def build_tile(queryset, z: int, x: int, y: int) -> bytes:
+    """
+    Build a Mapbox vector tile of the spots in queryset, with a 'spots' layer of points
+    and a 'wegvakken' layer of the wegvak lines.
+    """
+    try:
+        spot_ids_sql, spot_ids_params = queryset.order_by().values('pk').query.sql_with_params()
+    except EmptyResultSet:
+        return b''
+
+    layers = []
+    for layer, geo_field in [('spots', 'point'), ('wegvakken', 'wegvak')]:
+        layers.append(f"""
+            (SELECT COALESCE(ST_AsMVT(layer, '{layer}', {TILE_EXTENT}, 'geom'), '')
+             FROM (
+                SELECT
+                    ST_AsMVTGeom(ST_Transform(s.{geo_field}, 3857), bounds.geom, {TILE_EXTENT}, {TILE_BUFFER})
+                    AS geom,
+                    s.id, s.locatie_id, s.spot_type, s.status, s.stadsdeel
+                FROM {Spot._meta.db_table} s, bounds
+                WHERE s.{geo_field} && bounds.geom_4326 AND s.id IN ({spot_ids_sql})
+             ) AS layer
+             WHERE layer.geom IS NOT NULL)
+        """)
+
+    sql = f"""
+        WITH bounds AS (
+            SELECT envelope AS geom, ST_Transform(envelope, 4326) AS geom_4326
+            FROM ST_MakeEnvelope(%s, %s, %s, %s, 3857) AS envelope
+        )
+        SELECT {' || '.join(layers)}
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*get_tile_bounds(z, x, y), *spot_ids_params, *spot_ids_params])
+        tile = cursor.fetchone()[0]
+    return bytes(tile)
@@ -1,33 +1,59 @@
+import gzip
 import logging
+import re
+import tempfile
 from datetime import date
 
 from datapunt_api.rest import DatapuntViewSet
 from django.conf import settings
-from django.http import Http404, HttpResponse, HttpResponseServerError, StreamingHttpResponse
+from django.db.models import Prefetch
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseServerError, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import parse_http_date_safe, quote_etag
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import mixins
 from rest_framework.decorators import action
+from rest_framework.filters import OrderingFilter
 from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
 from rest_framework.viewsets import GenericViewSet, ModelViewSet
 from swiftclient.exceptions import ClientException
 
 from api import serializers
-from api.renderers import GeojsonRenderer, StreamingCSVRenderer
+from api.export import (
+    get_copy_sql, is_copy_enabled, iter_copy_csv, iter_csv_rows, iter_geojsonseq, iter_parquet, write_xlsx,
+)
+from api.filters import SpotSpatialFilter
+from api.geojson import iter_geojson
+from api.pagination import HALCursorPagination
+from api.renderers import GeojsonRenderer, MVTRenderer, StreamingCSVRenderer
 from api.serializers import SpotCSVSerializer, SpotGeojsonSerializer
+from api.snapshots import TILES_CACHE_NAME, get_geojson_snapshot, get_snapshot, get_snapshot_etag
+from api.tiles import build_tile, is_valid_tile
 from datasets.blackspots import models
-from storage.objectstore import ObjectStore
+from storage.objectstore import DOCUMENT_CHUNK_SIZE, ObjectStore, get_document_cache
 
 logger = logging.getLogger(__name__)
 
 
 class SpotViewSet(DatapuntViewSet, ModelViewSet):
-    queryset = models.Spot.objects.all().order_by('pk')
+    # documents are nested in both the json and geojson representation of spots
+    queryset = models.Spot.objects.prefetch_related(
+        Prefetch('documents', queryset=models.Document.objects.order_by('pk'))).order_by('pk')
     serializer_class = serializers.SpotSerializer
     serializer_detail_class = serializers.SpotSerializer
     lookup_field = 'id'
     renderer_classes = (JSONRenderer, BrowsableAPIRenderer, GeojsonRenderer)
     parser_classes = [FormParser, MultiPartParser]
+    pagination_class = HALCursorPagination
+    filter_backends = [DjangoFilterBackend, OrderingFilter, SpotSpatialFilter]
+    filterset_fields = ['stadsdeel', 'spot_type', 'status']
+    # the cursor of a page holds the values of the ordering fields, so only columns of spots can be used
+    ordering_fields = [
+        'id', 'locatie_id', 'spot_type', 'description', 'stadsdeel', 'status', 'actiehouders',
+        'start_uitvoering', 'eind_uitvoering', 'jaar_blackspotlijst', 'jaar_ongeval_quickscan', 'jaar_oplevering',
+    ]
+    ordering = 'pk'
 
     def get_serializer_class(self, *args, **kwargs):
         """
@@ -47,6 +73,85 @@ class SpotViewSet(DatapuntViewSet, ModelViewSet):
         else:
             return DatapuntViewSet.paginate_queryset(self, *args, **kwargs)
 
+    def list(self, request, *args, **kwargs):
+        """
+        Overwrites super method to render geojson in the database, and to serve the full map,
+        geojson without any filters, from a snapshot
+        """
+        if request.accepted_renderer.format == 'geojson':
+            if set(request.query_params) <= {'format'}:
+                return self.get_geojson_snapshot_response(request)
+            return StreamingHttpResponse(
+                (chunk.encode('utf-8') for chunk in iter_geojson(self.filter_queryset(self.get_queryset()), request)),
+                content_type=request.accepted_renderer.media_type,
+            )
+        return super().list(request, *args, **kwargs)
+
+    def get_geojson_snapshot_response(self, request):
+        # the etag is the data version, so the client's copy is validated without reading the snapshot
+        version = models.DataVersion.get_version()
+        etag = get_snapshot_etag(version)
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            _, snapshot = get_geojson_snapshot(
+                base_url=request.build_absolute_uri('/'),
+                build_content=self.render_geojson,
+                version=version,
+            )
+            if re.search(r'\bgzip\b', request.META.get('HTTP_ACCEPT_ENCODING', '')):
+                response = HttpResponse(snapshot, content_type=request.accepted_renderer.media_type)
+                response['Content-Encoding'] = 'gzip'
+            else:
+                response = HttpResponse(gzip.decompress(snapshot), content_type=request.accepted_renderer.media_type)
+        response['ETag'] = etag
+        patch_vary_headers(response, ['Accept-Encoding'])
+        return response
+
+    def render_geojson(self) -> bytes:
+        return ''.join(iter_geojson(self.get_queryset(), self.request)).encode('utf-8')
+
+    @action(detail=False, url_path=r'tiles/(?P<z>\d+)/(?P<x>\d+)/(?P<y>\d+)', methods=['get'],
+            renderer_classes=[MVTRenderer])
+    def tiles(self, request, z, x, y, format=None):
+        """
+        Mapbox vector tile of the (filtered) spots, cached per data version
+        """
+        z, x, y = int(z), int(x), int(y)
+        if not is_valid_tile(z, x, y):
+            raise Http404("Tile does not exist")
+
+        # the etag is the data version, so the client's copy is validated without reading the tile cache
+        version = models.DataVersion.get_version()
+        etag = get_snapshot_etag(version)
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            queryset = self.filter_queryset(self.get_queryset())
+            # only the filters are part of the key, so other query parameters can not fill the cache
+            filters = '&'.join(
+                f'{key}={request.query_params[key]}'
+                for key in [*self.filterset_fields, *SpotSpatialFilter.query_params]
+                if key in request.query_params
+            )
+            _, tile = get_snapshot(f"tile:{z}/{x}/{y}:{filters}", lambda: build_tile(queryset, z, x, y),
+                                   cache_name=TILES_CACHE_NAME, version=version)
+            response = HttpResponse(tile, content_type=MVTRenderer.media_type)
+        response['ETag'] = etag
+        return response
+
+    def perform_create(self, serializer):
+        super().perform_create(serializer)
+        models.DataVersion.bump()
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        models.DataVersion.bump()
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        models.DataVersion.bump()
+
 
 class CSVDownloadViewSet:
 
@@ -59,9 +164,19 @@ class CSVDownloadViewSet:
 
         response_class = StreamingHttpResponse if stream_response else HttpResponse
         response = response_class(renderer.render(data=serializer.data, fieldnames=fieldnames), content_type="text/csv")
+        return self.add_filename(response, filename_prefix)
 
+    def stream_csv_rows(self, rows, fieldnames, filename_prefix):
+        """
+        Stream rows given as lists of values, which is much faster than streaming serializer data
+        """
+        renderer = StreamingCSVRenderer()
+        response = StreamingHttpResponse(renderer.render_rows(rows, fieldnames), content_type="text/csv")
+        return self.add_filename(response, filename_prefix)
+
+    def add_filename(self, response, filename_prefix, extension="csv"):
         today = date.today()
-        filename = f"{filename_prefix}_{today}.csv"
+        filename = f"{filename_prefix}_{today}.{extension}"
         response['Content-Disposition'] = b'attachment; filename=' + filename.encode(encoding='utf-8') + b';'
 
         return response
@@ -75,10 +190,47 @@ class SpotExportViewSet(mixins.ListModelMixin, GenericViewSet, CSVDownloadViewSe
     pagination_class = None
 
     def list(self, request, *args, **kwargs):
+        """
+        Export the spots as csv, with the fields of SpotCSVSerializer read directly from the database,
+        or written by the database itself if it supports that
+        """
         queryset = self.filter_queryset(self.get_queryset())
-        serializer = self.get_serializer(queryset, many=True)
-        return self.stream_csv_download(
-            stream_response=True, serializer=serializer, filename_prefix="wba_export")
+        fieldnames = self.get_serializer().fields.keys()
+        if is_copy_enabled():
+            response = StreamingHttpResponse(iter_copy_csv(get_copy_sql(queryset), fieldnames), content_type="text/csv")
+            return self.add_filename(response, filename_prefix="wba_export")
+        return self.stream_csv_rows(rows=iter_csv_rows(queryset), fieldnames=fieldnames, filename_prefix="wba_export")
+
+    @action(detail=False, methods=['get'])
+    def xlsx(self, request):
+        """
+        Export the spots as an xlsx workbook, which is written to a temporary file first
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        file = tempfile.TemporaryFile()
+        write_xlsx(queryset, file)
+        file.seek(0)
+        response = FileResponse(file, content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        return self.add_filename(response, filename_prefix="wba_export", extension="xlsx")
+
+    @action(detail=False, methods=['get'])
+    def geojsonseq(self, request):
+        """
+        Export the spots, including their wegvak, as a GeoJSON text sequence
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(
+            (chunk.encode('utf-8') for chunk in iter_geojsonseq(queryset)), content_type="application/geo+json-seq")
+        return self.add_filename(response, filename_prefix="wba_export", extension="geojsons")
+
+    @action(detail=False, methods=['get'])
+    def parquet(self, request):
+        """
+        Export the spots as a parquet file, for bulk analytics
+        """
+        queryset = self.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(iter_parquet(queryset), content_type="application/vnd.apache.parquet")
+        return self.add_filename(response, filename_prefix="wba_export", extension="parquet")
 
 
 def handle_swift_exception(container_name: str, filename: str, e: ClientException) -> HttpResponse:
@@ -95,7 +247,10 @@ def handle_swift_exception(container_name: str, filename: str, e: ClientExceptio
         logger.error(f'Error with object store connection, error: {e}')
         return HttpResponseServerError()
 
-    if 'Object GET failed' in e.msg:
+    if e.http_status == 416:
+        return HttpResponse(status=416)
+
+    if e.http_status == 404 or 'Object GET failed' in e.msg:
         logger.error(f'Requested file not found on object store: {path}, error: {e.msg}')
         raise Http404("File does not exist")
 
@@ -104,9 +259,14 @@ def handle_swift_exception(container_name: str, filename: str, e: ClientExceptio
 
 
 class DocumentViewSet(DatapuntViewSet):
-    queryset = models.Document.objects.all().order_by('pk')
+    # the spot is only rendered as a link, for which its id is enough
+    queryset = models.Document.objects.select_related('spot').only(
+        'id', 'type', 'filename', 'spot__id').order_by('pk')
     serializer_class = serializers.DocumentSerializer
     serializer_detail_class = serializers.DocumentSerializer
+    pagination_class = HALCursorPagination
+    ordering_fields = ['id', 'type', 'filename']
+    ordering = 'pk'
 
     @action(detail=True, url_path='file', methods=['get'])
     def get_file(self, request, pk=None):
@@ -116,16 +276,78 @@ class DocumentViewSet(DatapuntViewSet):
 
         objstore = ObjectStore(settings.OBJECTSTORE_CONNECTION_CONFIG)
         connection = objstore.get_connection()
+        document_cache = get_document_cache()
+        is_conditional = 'HTTP_IF_NONE_MATCH' in request.META or 'HTTP_IF_MODIFIED_SINCE' in request.META
+        # swift answers range requests itself, with a 206 and a content-range header
+        request_headers = {'Range': request.META['HTTP_RANGE']} if 'HTTP_RANGE' in request.META else None
+        if_range = request.META.get('HTTP_IF_RANGE') if request_headers is not None else None
+
+        if is_conditional or if_range is not None or (document_cache.enabled and request_headers is None):
+            # the etag from a HEAD request validates the client's copy, and finds the cached copy
+            try:
+                headers = objstore.get_document_headers(connection, container_path, filename)
+            except ClientException as e:
+                return handle_swift_exception(container_path, filename, e)
+
+            if if_range is not None and not if_range_matches(if_range, headers):
+                # the part would not fit the client's copy, so the whole document is sent instead
+                request_headers = None
+            response = get_conditional_response(
+                request,
+                etag=quote_etag(headers['etag']) if 'etag' in headers else None,
+                last_modified=parse_http_date_safe(headers.get('last-modified', '')),
+            )
+            if response is None and request_headers is None:
+                cached_file = document_cache.get(container_path, filename, headers.get('etag'))
+                if cached_file:
+                    # FileResponse lets the server use sendfile for the cached file
+                    response = FileResponse(cached_file, content_type=headers.get('content-type'))
+                    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+            if response is not None:
+                add_document_validators(response, headers)
+                return response
+
         try:
-            store_object = objstore.get_document(connection, container_path, filename)
+            headers, chunks = objstore.get_document(
+                connection, container_path, filename, chunk_size=DOCUMENT_CHUNK_SIZE, headers=request_headers)
         except ClientException as e:
             return handle_swift_exception(container_path, filename, e)
 
-        content_type = store_object[0].get('content-type')
-        obj_data = store_object[1]
+        if 'content-range' not in headers:
+            chunks = document_cache.read_through(
+                container_path, filename, headers.get('etag'), chunks, size=headers.get('content-length'))
 
-        response = HttpResponse(content_type=content_type)
+        # stream the document, so only one chunk at a time is held in memory
+        response = StreamingHttpResponse(chunks, content_type=headers.get('content-type'))
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        response.write(obj_data)
+        for header in ['content-length', 'content-range']:
+            if header in headers:
+                response[header] = headers[header]
+        if 'content-range' in headers:
+            response.status_code = 206
+        add_document_validators(response, headers)
 
         return response
+
+
+def if_range_matches(if_range, headers):
+    """
+    Check the If-Range header of a range request against the validators of a document on the object
+    store. Only a strong etag or a last modified date that matches exactly keeps the range.
+    """
+    if if_range.startswith(('"', 'W/')):
+        return 'etag' in headers and if_range == quote_etag(headers['etag'])
+    last_modified = parse_http_date_safe(headers.get('last-modified', ''))
+    return last_modified is not None and parse_http_date_safe(if_range) == last_modified
+
+
+def add_document_validators(response, headers):
+    """
+    Pass the validators of a document on the object store on to the response,
+    so clients can cache the document and make conditional and range requests.
+    """
+    if 'etag' in headers:
+        response['ETag'] = quote_etag(headers['etag'])
+    if 'last-modified' in headers:
+        response['Last-Modified'] = headers['last-modified']
+    response['Accept-Ranges'] = 'bytes'
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.4 on 2026-10-18 14:05
+
+import datasets.blackspots.models
+from django.db import migrations, models
+
+
+def create_data_version(apps, schema_editor):
+    # the single version row, so requests only read it
+    DataVersion = apps.get_model('blackspots', 'DataVersion')
+    DataVersion.objects.create(pk=1, version=datasets.blackspots.models.new_data_version())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blackspots', '0017_stadsdeel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.CharField(default=datasets.blackspots.models.new_data_version, max_length=32)),
+            ],
+        ),
+        migrations.RunPython(create_data_version, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.4 on 2026-10-18 16:20
+
+from django.db import migrations
+
+# Django creates these GiST indexes for geometry fields with spatial_index=True, under
+# the same names. The spatial filters of the API depend on them, so make sure they exist.
+SPATIAL_INDEXES = [
+    ('blackspots_spot_point_id', 'point'),
+    ('blackspots_spot_wegvak_id', 'wegvak'),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blackspots', '0018_dataversion'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=f'CREATE INDEX IF NOT EXISTS {name} ON blackspots_spot USING GIST ({column})',
+            reverse_sql=migrations.RunSQL.noop,
+        )
+        for name, column in SPATIAL_INDEXES
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.4 on 2026-10-18 17:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blackspots', '0019_spot_spatial_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='spot',
+            index=models.Index(fields=['stadsdeel', 'spot_type', 'id'], name='spot_stadsdeel_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='spot',
+            index=models.Index(fields=['spot_type', 'id'], name='spot_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='spot',
+            index=models.Index(fields=['status', 'id'], name='spot_status_idx'),
+        ),
+    ]
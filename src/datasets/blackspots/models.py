@@ -1,3 +1,5 @@
+import uuid
+
 from django.contrib.gis.db import models
 from django.utils.text import get_valid_filename
 from djchoices import ChoiceItem, DjangoChoices
@@ -56,6 +58,15 @@ class Spot(models.Model):
     jaar_ongeval_quickscan = models.IntegerField(null=True, blank=True)
     jaar_oplevering = models.IntegerField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # the export is ordered by stadsdeel, spot_type and id, and often filtered by stadsdeel
+            models.Index(fields=['stadsdeel', 'spot_type', 'id'], name='spot_stadsdeel_type_idx'),
+            # the list is ordered by id, and can be filtered by spot_type or status
+            models.Index(fields=['spot_type', 'id'], name='spot_type_idx'),
+            models.Index(fields=['status', 'id'], name='spot_status_idx'),
+        ]
+
     def __str__(self):
         return f'{self.locatie_id}: {self.spot_type}'
 
@@ -84,3 +95,58 @@ class Document(models.Model):
         doc_type = "ontwerp" if self.type == Document.DocumentType.Ontwerp else "rapportage"
         base_filename = f"{self.spot.locatie_id}_{doc_type}_{self.spot.description}.pdf"
         return get_valid_filename(base_filename)
+
+
+class ImportState(models.Model):
+    """
+    Fingerprint of the object store contents that were used by an import,
+    used to skip imports when nothing changed.
+    """
+    xls_etag = models.CharField(max_length=64)
+    documents_hash = models.CharField(max_length=64)
+    imported_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.imported_at}: {self.xls_etag}'
+
+
+class Stadsdeel(models.Model):
+    """
+    Boundary of a stadsdeel, used to determine the stadsdeel of a point
+    without calling the BAG geosearch API.
+    """
+    code = models.CharField(max_length=3, choices=Spot.Stadsdelen.choices, unique=True)
+    naam = models.CharField(max_length=64)
+    geometrie = models.MultiPolygonField(srid=4326)
+
+    def __str__(self):
+        return self.naam
+
+
+def new_data_version():
+    return uuid.uuid4().hex
+
+
+class DataVersion(models.Model):
+    """
+    Version of the spots and their documents, replaced on every import and edit.
+    Used to invalidate data derived from all spots, such as the geojson snapshot.
+    A random version, instead of a counter, is never reused when the database is reset.
+    """
+    version = models.CharField(max_length=32, default=new_data_version)
+
+    @classmethod
+    def get_version(cls) -> str:
+        try:
+            return cls.objects.get(pk=1).version
+        except cls.DoesNotExist:
+            # migration 0018 creates the version, it is only missing when the table was emptied
+            data_version, _ = cls.objects.get_or_create(pk=1)
+            return data_version.version
+
+    @classmethod
+    def bump(cls):
+        cls.objects.update_or_create(pk=1, defaults={'version': new_data_version()})
+
+    def __str__(self):
+        return self.version
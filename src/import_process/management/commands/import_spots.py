@@ -3,11 +3,13 @@ import os
 
 from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db import transaction
 
-from datasets.blackspots.models import Document, Spot
+from datasets.blackspots.models import DataVersion, Document, ImportState, Spot
 from import_process.clean import clear_models
-from import_process.process_xls import process_xls
-from storage.objectstore import ObjectStore
+from import_process.process_xls import collect_spots, create_spots
+from import_process.sync import sync_models
+from storage.objectstore import DocumentIndex, ObjectStore, get_documents_fingerprint
 
 logging.basicConfig(level=logging.DEBUG)
 log = logging.getLogger(__name__)
@@ -16,15 +18,25 @@ log = logging.getLogger(__name__)
 class Command(BaseCommand):
     help = 'Import blackspots from objectstore'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Only apply the differences between the xls file and the database, '
+                 'instead of clearing and reloading all spots',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Import even if the xls file and documents list did not change since the last import',
+        )
+
     def handle(self, *args, **options):
         assert os.getenv('OBJECTSTORE_PASSWORD')
-        perform_import()
-
+        perform_import(incremental=options['incremental'], force=options['force'])
 
-def perform_import():
-    log.info('Clearing models')
-    clear_models()
 
+def perform_import(incremental=False, force=False):
     objstore = ObjectStore(config=settings.OBJECTSTORE_CONNECTION_CONFIG)
 
     log.info('Opening object store connection')
@@ -33,11 +45,40 @@ def perform_import():
     log.info('Getting documents list')
     document_list = objstore.get_wba_documents_list(connection)
     log.info(f'document list size: {len(document_list)}')
+    documents_hash = get_documents_fingerprint(document_list)
+
+    xls_etag = objstore.get_spots_etag(connection)
+    last_import = ImportState.objects.order_by('-id').first()
+    xls_changed = force or last_import is None or last_import.xls_etag != xls_etag or not Spot.objects.exists()
+
+    if not xls_changed:
+        if last_import.documents_hash == documents_hash:
+            log.info('Xls file and documents list did not change since the last import, skipping import')
+            return
+        # only the documents need to be linked again, which is what an incremental import does
+        log.info('Xls file did not change since the last import, only updating documents')
+        incremental = True
 
     log.info('Fetching xls file')
-    xls_path = objstore.fetch_spots(connection)
-    log.info('Importing xls file')
-    process_xls(xls_path, document_list)
+    xls_path = objstore.fetch_spots(connection, etag=xls_etag)
+    log.info('Parsing xls file')
+    spots, documents = collect_spots(xls_path, DocumentIndex(document_list))
+
+    # The xls file is completely parsed before the database is touched, and all
+    # writes happen in one transaction. Until it commits, the API keeps serving the
+    # previous generation of spots, and a failing import leaves that generation intact.
+    with transaction.atomic():
+        if incremental:
+            log.info('Importing spots incrementally')
+            sync_models(spots, documents)
+        else:
+            log.info('Clearing models')
+            clear_models()
+            log.info('Importing spots')
+            create_spots(spots, documents)
+
+        ImportState.objects.create(xls_etag=xls_etag, documents_hash=documents_hash)
+        DataVersion.bump()
 
     log.info(f'Spot count: {Spot.objects.all().count()}')
     log.info(f'Document count: {Document.objects.all().count()}')
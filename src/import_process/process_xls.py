@@ -1,16 +1,19 @@
+import datetime
 import json
 import logging
 
 import xlrd
 from django.contrib.gis.geos import LineString, Point
-from xlrd import open_workbook
 
 from datasets.blackspots.models import Document, Spot
 from import_process import util
-from storage.objectstore import DocumentList
+from import_process.reader import open_sheet
+from storage.objectstore import DocumentIndex
 
 log = logging.getLogger(__name__)
 
+BULK_CREATE_BATCH_SIZE = 500
+
 EXCEL_STRUCTURE = {
     'number':               {'column_idx': 0, 'header': 'Nummer'},
     'description':          {'column_idx': 1, 'header': 'Locatie omschrijving'},
@@ -33,33 +36,23 @@ EXCEL_STRUCTURE = {
 }
 
 
-def get_sheet_cell(sheet, column_name, row_idx):
-    value = EXCEL_STRUCTURE.get(column_name)
-    assert value is not None, f'column name not recognised: {column_name}'
-    return sheet.cell_value(row_idx, value.get('column_idx'))
-
-
-def get_sheet_date_cell(sheet, column_name, row_idx, date_mode):
-    value = EXCEL_STRUCTURE.get(column_name)
-    assert value is not None, f'column name not recognised: {column_name}'
-    cell_value = sheet.cell_value(row_idx, value.get('column_idx'))
-    if isinstance(cell_value, str):
-        return cell_value
-    datetime = xlrd.xldate.xldate_as_datetime(cell_value, date_mode)
-    date_str = datetime.strftime("%d/%m/%y")
-    return date_str
-
-
-def assert_column_name(sheet, column_idx, expected):
-    value = sheet.cell_value(0, column_idx).strip()
-    assert value == expected, f'header {column_idx} is not expected value {expected} but {value}'
+def get_date_string(value, date_mode):
+    if isinstance(value, str):
+        return value
+    if not isinstance(value, datetime.datetime):
+        # xls dates are stored as floats
+        value = xlrd.xldate.xldate_as_datetime(value, date_mode)
+    return value.strftime("%d/%m/%y")
 
 
-def check_column_names(sheet):
+def check_column_names(headers):
     for value in EXCEL_STRUCTURE.values():
         if value.get('skip', False):
             continue
-        assert_column_name(sheet, value.get('column_idx'), value.get('header'))
+        column_idx = value.get('column_idx')
+        header = str(headers[column_idx]).strip() if column_idx < len(headers) else ''
+        expected = value.get('header')
+        assert header == expected, f'header {column_idx} is not expected value {expected} but {header}'
 
 
 class InputError(Exception):
@@ -136,80 +129,131 @@ def get_wegvak(input: str):
     return None
 
 
-def create_document(
-        document_list: DocumentList,
+def build_document(
+        document_index: DocumentIndex,
         doc_type: Document.DocumentType,
         filename: str,
         spot: Spot
 ):
+    """
+    Return an unsaved Document for the given filename, or None when there is
+    no filename or the file is missing from the folder of its type on the object store.
+    """
     if not filename or len(filename) == 0:
-        return
-
-    available_filenames = [filename for [_, filename] in document_list]
-    if filename not in available_filenames:
-        log_error(f'Missing file on object store: {filename} of type {doc_type}')
-        return
+        return None
 
-    Document.objects.create(type=doc_type, filename=filename, spot=spot)
+    if not document_index.contains(doc_type, filename):
+        folders = document_index.get_folders(filename)
+        if folders:
+            log_error(f'File on object store is in the wrong folder: {filename} of type {doc_type} '
+                      f'found in {", ".join(sorted(folders))}')
+        else:
+            log_error(f'Missing file on object store: {filename} of type {doc_type}')
+        return None
 
+    return Document(type=doc_type, filename=filename, spot=spot)
 
-def process_xls(xls_path, document_list: DocumentList):
-    book = open_workbook(xls_path)
 
-    sheet = book.sheet_by_index(0)
+def create_document(
+        document_index: DocumentIndex,
+        doc_type: Document.DocumentType,
+        filename: str,
+        spot: Spot
+):
+    document = build_document(document_index, doc_type, filename, spot)
+    if document:
+        document.save()
+
+
+def read_spots(xls_path):
+    """
+    Parse the spots sheet without touching the database.
+    :param xls_path: path to the xls or xlsx file
+    :return: generator of (spot_data, document_filenames) tuples, where
+    document_filenames is a list of (document type, filename) tuples
+    """
+    with open_sheet(xls_path) as sheet:
+        check_column_names(sheet.read_headers())
+
+        for row in sheet.rows(EXCEL_STRUCTURE):
+            latitude = row['lat']
+            longitude = row['lng']
+            try:
+                point = Point(longitude, latitude)
+            except TypeError as e:
+                # TODO raise exception
+                log_error(f"Unknown point: {latitude}, {longitude}: \"{e}\", skipping")
+                continue
+
+            wegvak = get_wegvak(row['wegvak'])
+
+            stadsdeel = get_stadsdeel(row['stadsdeel'])
+
+            jaar_blackspotlijst = get_integer(row['jaar_blackspot'], 'blackspotlijst')
+            jaar_quickscan = get_integer(row['jaar_quickscan'], 'quickscan')
+            try:
+                spot_type = get_spot_type(row['type'])
+                status = get_status(row['status'])
+            except SkipError as e:
+                log_error(f"\"{e}\", skipping")
+                continue
+            spot_data = {
+                "locatie_id": row['number'],
+                "actiehouders": row['actiehouders'],
+                "spot_type": spot_type,
+                "description": row['description'],
+                "point": point,
+                "wegvak": wegvak,
+                "stadsdeel": stadsdeel,
+                "status": status,
+
+                "start_uitvoering": get_date_string(row['start_uitvoering'], sheet.datemode),
+                "eind_uitvoering": get_date_string(row['eind_uitvoering'], sheet.datemode),
+                "tasks": row['tasks'],
+                "notes": row['notes'],
+
+                "jaar_blackspotlijst": jaar_blackspotlijst,
+                "jaar_ongeval_quickscan": jaar_quickscan,
+                "jaar_oplevering": get_integer(row['jaar_oplevering'], 'oplevering'),
+            }
+            document_filenames = [
+                (Document.DocumentType.Rapportage, row['rapportage']),
+                (Document.DocumentType.Ontwerp, row['ontwerp']),
+            ]
+
+            yield spot_data, document_filenames
+
+
+def collect_spots(xls_path, document_index: DocumentIndex):
+    """
+    Parse the xls file into unsaved Spot and Document instances.
+    :return: tuple of a dict of spots by locatie_id and a list of documents
+    """
+    spots = {}
+    documents = []
+    for spot_data, document_filenames in read_spots(xls_path):
+        locatie_id = spot_data['locatie_id']
+        if locatie_id in spots:
+            log_error(f"Duplicate locatie_id: {locatie_id}, skipping")
+            continue
 
-    check_column_names(sheet)
+        spot = Spot(**spot_data)
+        spots[locatie_id] = spot
 
-    for row_idx in range(1, sheet.nrows):
-        latitude = get_sheet_cell(sheet, 'lat', row_idx)
-        longitude = get_sheet_cell(sheet, 'lng', row_idx)
-        try:
-            point = Point(longitude, latitude)
-        except TypeError as e:
-            # TODO raise exception
-            log_error(f"Unknown point: {latitude}, {longitude}: \"{e}\", skipping")
-            continue
+        for doc_type, filename in document_filenames:
+            document = build_document(document_index, doc_type, filename, spot)
+            if document:
+                documents.append(document)
 
-        wegvak = get_wegvak(get_sheet_cell(sheet, 'wegvak', row_idx))
+    return spots, documents
 
-        stadsdeel = get_stadsdeel(get_sheet_cell(sheet, 'stadsdeel', row_idx))
 
-        jaar_blackspotlijst = get_integer(get_sheet_cell(sheet, 'jaar_blackspot', row_idx), 'blackspotlijst')
-        jaar_quickscan = get_integer(get_sheet_cell(sheet, 'jaar_quickscan', row_idx), 'quickscan')
-        try:
-            spot_type = get_spot_type(get_sheet_cell(sheet, 'type', row_idx))
-            status = get_status(get_sheet_cell(sheet, 'status', row_idx))
-        except SkipError as e:
-            log_error(f"\"{e}\", skipping")
-            continue
-        spot_data = {
-            "locatie_id": get_sheet_cell(sheet, 'number', row_idx),
-            "actiehouders": get_sheet_cell(sheet, 'actiehouders', row_idx),
-            "spot_type": spot_type,
-            "description": get_sheet_cell(sheet, 'description', row_idx),
-            "point": point,
-            "wegvak": wegvak,
-            "stadsdeel": stadsdeel,
-            "status": status,
-
-            "start_uitvoering": get_sheet_date_cell(sheet, 'start_uitvoering', row_idx, book.datemode),
-            "eind_uitvoering": get_sheet_date_cell(sheet, 'eind_uitvoering', row_idx, book.datemode),
-            "tasks": get_sheet_cell(sheet, 'tasks', row_idx),
-            "notes": get_sheet_cell(sheet, 'notes', row_idx),
-
-            "jaar_blackspotlijst": jaar_blackspotlijst,
-            "jaar_ongeval_quickscan": jaar_quickscan,
-            "jaar_oplevering": get_integer(get_sheet_cell(sheet, 'jaar_oplevering', row_idx), 'oplevering'),
-        }
-
-        [spot, _] = Spot.objects.get_or_create(**spot_data)
-
-        create_document(document_list,
-                        Document.DocumentType.Rapportage,
-                        get_sheet_cell(sheet, 'rapportage', row_idx),
-                        spot)
-
-        create_document(document_list,
-                        Document.DocumentType.Ontwerp,
-                        get_sheet_cell(sheet, 'ontwerp', row_idx),
-                        spot)
+def create_spots(spots, documents):
+    """
+    Write the spots and documents from collect_spots using bulk inserts.
+    Document foreign keys are resolved after the spots are inserted, so this
+    costs a fixed number of queries per batch instead of several queries per row.
+    """
+    Spot.objects.bulk_create(spots.values(), batch_size=BULK_CREATE_BATCH_SIZE)
+    # the spots now have their primary keys, which bulk_create copies to document.spot_id
+    Document.objects.bulk_create(documents, batch_size=BULK_CREATE_BATCH_SIZE)
@@ -0,0 +1,109 @@
+import os
+from abc import ABC, abstractmethod
+
+import xlrd
+from openpyxl import load_workbook
+
+
+class SheetReader(ABC):
+    """
+    Column based reader for the first sheet of a workbook.
+
+    Only the requested columns are extracted, one whole column at a time,
+    and rows are built from those columns.
+    """
+
+    # date system of the workbook, only used for xls dates which are stored as floats
+    datemode = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        pass
+
+    @abstractmethod
+    def read_headers(self):
+        """
+        :return: list of the values in the header row
+        """
+
+    @abstractmethod
+    def read_columns(self, column_indices):
+        """
+        :return: list of the values below the header for each of the given column indices
+        """
+
+    def rows(self, structure):
+        """
+        Generate a dict per row, mapping the column names of structure to the cell values.
+        :param structure: dict of column names to dicts containing the 'column_idx'
+        """
+        names = list(structure)
+        columns = self.read_columns([structure[name]['column_idx'] for name in names])
+        for values in zip(*columns):
+            yield dict(zip(names, values))
+
+
+class XlsReader(SheetReader):
+
+    def __init__(self, path):
+        # on_demand only loads the sheets that are actually used
+        self.book = xlrd.open_workbook(path, on_demand=True)
+        self.sheet = self.book.sheet_by_index(0)
+        self.datemode = self.book.datemode
+
+    def close(self):
+        self.book.release_resources()
+
+    def read_headers(self):
+        return self.sheet.row_values(0)
+
+    def read_columns(self, column_indices):
+        return [self.sheet.col_values(column_idx, start_rowx=1) for column_idx in column_indices]
+
+
+class XlsxReader(SheetReader):
+
+    def __init__(self, path):
+        # a read only workbook streams the sheet instead of loading all cells in memory
+        self.book = load_workbook(path, read_only=True, data_only=True)
+        self.sheet = self.book.worksheets[0]
+        # the dimensions stored in the file are not always correct
+        self.sheet.reset_dimensions()
+
+    def close(self):
+        self.book.close()
+
+    @staticmethod
+    def get_values(row, column_indices):
+        # empty cells are None in openpyxl and '' in xlrd, use '' for both
+        values = []
+        for column_idx in column_indices:
+            value = row[column_idx] if column_idx < len(row) else None
+            values.append('' if value is None else value)
+        return values
+
+    def read_headers(self):
+        headers = next(self.sheet.iter_rows(max_row=1, values_only=True), ())
+        return self.get_values(headers, range(len(headers)))
+
+    def read_columns(self, column_indices):
+        columns = [[] for _ in column_indices]
+        for row in self.sheet.iter_rows(min_row=2, values_only=True):
+            for column, value in zip(columns, self.get_values(row, column_indices)):
+                column.append(value)
+        return columns
+
+
+def open_sheet(path) -> SheetReader:
+    """
+    Open the first sheet of an xls or xlsx file.
+    """
+    _, extension = os.path.splitext(path)
+    if extension.lower() == '.xlsx':
+        return XlsxReader(path)
+    return XlsReader(path)
@@ -0,0 +1,101 @@
+import logging
+from collections import defaultdict
+
+from datasets.blackspots.models import Document, Spot
+from import_process.process_xls import BULK_CREATE_BATCH_SIZE
+
+log = logging.getLogger(__name__)
+
+SPOT_FIELDS = [field for field in Spot._meta.concrete_fields if not field.primary_key]
+
+
+def get_changed_fields(spot: Spot, new_spot: Spot):
+    """
+    Copy the values of new_spot onto spot, and return the names of the fields that changed.
+    Values are compared after database preparation, so e.g. a point without srid
+    equals the same point with srid 4326.
+    """
+    changed_fields = []
+    for field in SPOT_FIELDS:
+        value = getattr(spot, field.attname)
+        new_value = getattr(new_spot, field.attname)
+        if field.get_prep_value(value) != field.get_prep_value(new_value):
+            setattr(spot, field.attname, new_value)
+            changed_fields.append(field.name)
+    return changed_fields
+
+
+def sync_spots(new_spots):
+    """
+    Apply the difference between new_spots and the spots in the database,
+    keyed on locatie_id. Existing spots keep their id.
+    :param new_spots: dict of unsaved spots by locatie_id
+    :return: dict of saved spots by locatie_id
+    """
+    existing_spots = Spot.objects.in_bulk(field_name='locatie_id')
+
+    to_create = [spot for locatie_id, spot in new_spots.items() if locatie_id not in existing_spots]
+    Spot.objects.bulk_create(to_create, batch_size=BULK_CREATE_BATCH_SIZE)
+
+    # bulk_update writes every given field for every given spot, so group
+    # the spots by their changed fields to only update what actually changed
+    to_update = defaultdict(list)
+    for locatie_id, new_spot in new_spots.items():
+        spot = existing_spots.get(locatie_id)
+        if spot is None:
+            continue
+        changed_fields = get_changed_fields(spot, new_spot)
+        if changed_fields:
+            to_update[tuple(changed_fields)].append(spot)
+    for fields, spots in to_update.items():
+        Spot.objects.bulk_update(spots, fields, batch_size=BULK_CREATE_BATCH_SIZE)
+
+    removed = [locatie_id for locatie_id in existing_spots if locatie_id not in new_spots]
+    Spot.objects.filter(locatie_id__in=removed).delete()
+
+    log.info(f'Spots created: {len(to_create)}, '
+             f'updated: {sum(len(spots) for spots in to_update.values())}, '
+             f'deleted: {len(removed)}')
+
+    saved_spots = {locatie_id: existing_spots.get(locatie_id, spot) for locatie_id, spot in new_spots.items()}
+    return saved_spots
+
+
+def sync_documents(new_documents, saved_spots):
+    """
+    Apply the difference between new_documents and the documents in the database.
+    Documents are identified by their spot, type and filename.
+    :param new_documents: list of unsaved documents, linked to the unsaved spots
+    :param saved_spots: dict of saved spots by locatie_id
+    """
+    existing_documents = {
+        (document.spot_id, document.type, document.filename): document.id
+        for document in Document.objects.only('id', 'spot_id', 'type', 'filename')
+    }
+
+    to_create = {}
+    for document in new_documents:
+        spot = saved_spots[document.spot.locatie_id]
+        key = (spot.id, document.type, document.filename)
+        if key not in existing_documents:
+            to_create[key] = Document(type=document.type, filename=document.filename, spot=spot)
+    Document.objects.bulk_create(to_create.values(), batch_size=BULK_CREATE_BATCH_SIZE)
+
+    new_keys = {
+        (saved_spots[document.spot.locatie_id].id, document.type, document.filename)
+        for document in new_documents
+    }
+    removed = [document_id for key, document_id in existing_documents.items() if key not in new_keys]
+    Document.objects.filter(id__in=removed).delete()
+
+    log.info(f'Documents created: {len(to_create)}, deleted: {len(removed)}')
+
+
+def sync_models(new_spots, new_documents):
+    """
+    Incrementally apply the spots and documents from collect_spots: insert new
+    spots, update only the changed columns of existing spots and delete spots
+    that are no longer in the xls file. The same is done for the linked documents.
+    """
+    saved_spots = sync_spots(new_spots)
+    sync_documents(new_documents, saved_spots)
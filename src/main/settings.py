@@ -140,6 +140,58 @@ if strtobool(os.getenv("DATABASE_ENABLED", "true")):
     }
 
 
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # file based by default, so the cache is shared by all uwsgi processes
+    "bag_geosearch": {
+        "BACKEND": os.getenv(
+            "BAG_GEO_SEARCH_CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"
+        ),
+        "LOCATION": os.getenv("BAG_GEO_SEARCH_CACHE_LOCATION", "/tmp/blackspots/cache/bag_geosearch"),
+        "TIMEOUT": int(os.getenv("BAG_GEO_SEARCH_CACHE_TIMEOUT", 7 * 24 * 60 * 60)),
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.getenv("BAG_GEO_SEARCH_CACHE_MAX_ENTRIES", 10000)),
+        },
+    },
+    # hit and miss counts of the bag_geosearch cache, apart from it so they are not culled with the lookups.
+    # Use a backend with an atomic incr, like memcached, when the counts must be exact.
+    "bag_geosearch_stats": {
+        "BACKEND": os.getenv(
+            "BAG_GEO_SEARCH_STATS_CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"
+        ),
+        "LOCATION": os.getenv("BAG_GEO_SEARCH_STATS_CACHE_LOCATION", "/tmp/blackspots/cache/bag_geosearch_stats"),
+        "TIMEOUT": None,
+    },
+    # snapshots of all spots, like the geojson of the full map, keyed by data version
+    "snapshots": {
+        "BACKEND": os.getenv("SNAPSHOTS_CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"),
+        "LOCATION": os.getenv("SNAPSHOTS_CACHE_LOCATION", "/tmp/blackspots/cache/snapshots"),
+        "TIMEOUT": int(os.getenv("SNAPSHOTS_CACHE_TIMEOUT", 24 * 60 * 60)),
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.getenv("SNAPSHOTS_CACHE_MAX_ENTRIES", 100)),
+        },
+    },
+    # vector tiles of the spots, keyed by tile, filters and data version
+    "tiles": {
+        "BACKEND": os.getenv("TILES_CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"),
+        "LOCATION": os.getenv("TILES_CACHE_LOCATION", "/tmp/blackspots/cache/tiles"),
+        "TIMEOUT": int(os.getenv("TILES_CACHE_TIMEOUT", 24 * 60 * 60)),
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.getenv("TILES_CACHE_MAX_ENTRIES", 5000)),
+        },
+    },
+}
+
+# read-through disk cache of documents downloaded from the object store, 0 disables it
+DOCUMENT_CACHE_DIR = os.getenv("DOCUMENT_CACHE_DIR", "/tmp/blackspots/cache/documents")
+DOCUMENT_CACHE_MAX_SIZE = int(os.getenv("DOCUMENT_CACHE_MAX_SIZE", 512 * 1024 * 1024))
+
+# let Postgres 12 and later write the csv export with COPY, instead of writing it in Python
+EXPORT_COPY_ENABLED = strtobool(os.getenv("EXPORT_COPY_ENABLED", "true"))
+
+
 SENTRY_DSN = os.getenv("SENTRY_DSN")
 if SENTRY_DSN:
     sentry_sdk.init(
@@ -149,6 +201,14 @@ if SENTRY_DSN:
     )
 
 BAG_GEO_SEARCH_API_URL = "https://api.data.amsterdam.nl/geosearch/bag/"
+BAG_GEO_SEARCH_API_TIMEOUT = float(os.getenv("BAG_GEO_SEARCH_API_TIMEOUT", 5))
+# number of decimals lat/lon are rounded to before caching, 5 decimals is roughly 1 meter
+BAG_GEO_SEARCH_CACHE_PRECISION = int(os.getenv("BAG_GEO_SEARCH_CACHE_PRECISION", 5))
+# timeout for points outside of Amsterdam, the timeout of other results is set on the cache
+BAG_GEO_SEARCH_CACHE_NEGATIVE_TIMEOUT = int(os.getenv("BAG_GEO_SEARCH_CACHE_NEGATIVE_TIMEOUT", 24 * 60 * 60))
+
+# seconds after which the stadsdeel boundaries are reloaded from the database
+STADSDEEL_BOUNDARIES_TTL = int(os.getenv("STADSDEEL_BOUNDARIES_TTL", 3600))
 
 OBJECTSTORE_CONNECTION_CONFIG = dict(
     VERSION="2.0",
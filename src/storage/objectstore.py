@@ -1,5 +1,13 @@
+import fcntl
+import hashlib
+import json
 import logging
 import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
 from typing import List, Tuple
 
 from django.conf import settings
@@ -14,12 +22,321 @@ XLS_OBJECT_NAME = 'VVP_Blackspot_Voortgangslijst_Kaart_actueel.xls'
 DOWNLOAD_DIR = '/tmp/blackspots/'
 WBA_CONTAINER_NAME = 'wbalijst'
 DOC_CONTAINER_NAME = 'doc'
+# size of the chunks in which files are downloaded to DOWNLOAD_DIR
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# size of the chunks in which documents are streamed from the object store
+DOCUMENT_CHUNK_SIZE = 64 * 1024
+# file in the document cache directory holding the total size of the cached documents
+TOTAL_SIZE_FILENAME = '.total-size'
 
 DocumentList = List[Tuple[str, str]]
 
 logger = logging.getLogger(__name__)
 
 
+def get_documents_fingerprint(document_list: DocumentList) -> str:
+    """
+    Hash of the documents list, independent of the order of the documents.
+    """
+    documents_hash = hashlib.sha256()
+    for path in sorted(os.path.join(*document) for document in document_list):
+        documents_hash.update(path.encode('utf-8') + b'\n')
+    return documents_hash.hexdigest()
+
+
+def get_document_folder(document_type) -> str:
+    """
+    Folder in the doc container in which documents of the given type are stored.
+    """
+    return 'ontwerp' if document_type == Document.DocumentType.Ontwerp else 'rapportage'
+
+
+def read_json_file(path: str) -> dict:
+    """
+    :return: contents of a json file, or an empty dict if it does not exist or is invalid
+    """
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def get_file_size(path: str):
+    """
+    :return: size of the file in bytes, or None if it does not exist
+    """
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+
+@contextmanager
+def open_atomic(path: str):
+    """
+    Open a temporary file next to path for writing, which is renamed to path when the block
+    completes. If the block fails, or a generator using it is closed early, it is removed instead.
+    """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            yield file
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def write_file_atomic(path: str, chunks) -> int:
+    """
+    Write the chunks to path with open_atomic.
+    :return: number of bytes written
+    """
+    size = 0
+    with open_atomic(path) as file:
+        for chunk in chunks:
+            file.write(chunk)
+            size += len(chunk)
+    return size
+
+
+class DocumentIndex:
+    """
+    Set based index of a documents list, for constant time lookups by filename
+    and by (folder, filename).
+    """
+
+    def __init__(self, document_list: DocumentList):
+        self.paths = set(document_list)
+        self.folders_by_filename = {}
+        for folder, filename in self.paths:
+            self.folders_by_filename.setdefault(filename, set()).add(folder)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def get_folders(self, filename: str) -> set:
+        """
+        :return: set of folders containing a document with the given filename
+        """
+        return self.folders_by_filename.get(filename, set())
+
+    def contains(self, document_type, filename: str) -> bool:
+        """
+        :return: whether the document exists in the folder of its document type
+        """
+        return (get_document_folder(document_type), filename) in self.paths
+
+
+class ConnectionPool:
+    """
+    Process wide pool of swift connections.
+
+    Swift connections are not thread safe, so each thread gets its own connection
+    per config. The auth token is shared by all connections with the same config,
+    and is reused until the object store rejects it. On a 401 the swift client
+    asks for a new token, and only then do we authenticate again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._auth = {}
+
+    def reset(self):
+        with self._lock:
+            self._auth = {}
+        self._local = threading.local()
+
+    def get_connection(self, config):
+        key = json.dumps(config, sort_keys=True, default=str)
+        connections = self._local.__dict__.setdefault('connections', {})
+        if key not in connections:
+            connections[key] = self.create_connection(key, config)
+        return connections[key]
+
+    def create_connection(self, key, config):
+        connection = objectstore.get_connection(config)
+        authenticate = connection.get_auth
+        used_auth = None
+
+        def get_auth():
+            # called by the swift client when the connection has no token yet,
+            # or when the token it used was rejected
+            nonlocal used_auth
+            with self._lock:
+                auth = self._auth.get(key)
+                if auth is None or auth == used_auth:
+                    logger.info("Authenticating with objectstore")
+                    auth = authenticate()
+                    self._auth[key] = auth
+            used_auth = auth
+            return auth
+
+        connection.get_auth = get_auth
+        return connection
+
+
+connection_pool = ConnectionPool()
+
+
+class DocumentCache:
+    """
+    Read-through disk cache of documents on the object store, bounded by size.
+
+    Every object gets its own directory, named after the hash of its container path
+    and name, in which its contents are stored in a file named after its etag. Stale
+    versions are therefore never served, and an object is invalidated by removing its
+    directory. Files are written to a temporary file first and renamed when complete.
+    The total size of the cache is kept in a file shared by all processes. When a new
+    file would grow the cache beyond max_size, the cache is walked and the least recently
+    used files are removed, reading a file from the cache updates its modification time.
+    """
+
+    def __init__(self, directory: str, max_size: int):
+        self.directory = directory
+        self.max_size = max_size
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get_object_dir(self, container_name: str, object_name: str) -> str:
+        key = hashlib.sha256(f'{container_name}/{object_name}'.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, key)
+
+    def get_path(self, container_name: str, object_name: str, etag: str) -> str:
+        return os.path.join(self.get_object_dir(container_name, object_name), etag)
+
+    def get(self, container_name: str, object_name: str, etag: str):
+        """
+        The file is opened here, so it can still be read when another process evicts it afterwards.
+        :return: cached file for this version of the object opened for reading, or None
+        """
+        if not self.enabled or not etag:
+            return None
+
+        path = self.get_path(container_name, object_name, etag)
+        try:
+            file = open(path, 'rb')
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return file
+
+    def read_through(self, container_name: str, object_name: str, etag: str, chunks, size=None):
+        """
+        Generate the chunks, while writing them to the cache. The file is only added to
+        the cache when all chunks were generated, so an aborted download is never cached.
+        """
+        if not self.enabled or not etag or (size is not None and int(size) > self.max_size):
+            yield from chunks
+            return
+
+        object_dir = self.get_object_dir(container_name, object_name)
+        os.makedirs(object_dir, exist_ok=True)
+        written = 0
+        with open_atomic(self.get_path(container_name, object_name, etag)) as file:
+            for chunk in chunks:
+                file.write(chunk)
+                written += len(chunk)
+                yield chunk
+
+        removed = self.remove_other_versions(object_dir, etag)
+        self.add_size(written - removed)
+
+    def remove_other_versions(self, object_dir: str, etag: str) -> int:
+        """
+        :return: number of bytes removed
+        """
+        removed = 0
+        for name in os.listdir(object_dir):
+            if name != etag and not name.startswith('.'):
+                path = os.path.join(object_dir, name)
+                try:
+                    size = os.path.getsize(path)
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                removed += size
+        return removed
+
+    def invalidate(self, container_name: str, object_name: str):
+        # the total size is not lowered, which at most makes the next write walk the cache a bit early
+        shutil.rmtree(self.get_object_dir(container_name, object_name), ignore_errors=True)
+
+    @contextmanager
+    def lock_total_size(self):
+        """
+        Lock the file holding the total size of the cache, which is shared by all processes.
+        :return: tuple of the locked file and the total size, or None if it is not known
+        """
+        with open(os.path.join(self.directory, TOTAL_SIZE_FILENAME), 'a+') as file:
+            # the lock is released when the file is closed
+            fcntl.flock(file, fcntl.LOCK_EX)
+            file.seek(0)
+            try:
+                total_size = int(file.read())
+            except ValueError:
+                total_size = None
+            yield file, total_size
+
+    @staticmethod
+    def write_total_size(file, total_size: int):
+        file.seek(0)
+        file.truncate()
+        file.write(str(total_size))
+        file.flush()
+
+    def add_size(self, size: int):
+        """
+        Add size to the total size of the cache, and evict files when the cache no longer fits.
+        The cache is only walked when it is full, or when its total size is not known yet.
+        """
+        with self.lock_total_size() as (file, total_size):
+            if total_size is None or total_size + size > self.max_size:
+                total_size = self.evict()
+            else:
+                total_size += size
+            self.write_total_size(file, total_size)
+
+    def evict(self) -> int:
+        """
+        Remove the least recently used files until the cache fits within max_size.
+        :return: total size of the files left in the cache
+        """
+        files = []
+        for object_dir, _, names in os.walk(self.directory):
+            for name in names:
+                if name.startswith('.'):
+                    continue
+                path = os.path.join(object_dir, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+
+        total_size = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+        return total_size
+
+
+def get_document_cache() -> DocumentCache:
+    return DocumentCache(settings.DOCUMENT_CACHE_DIR, settings.DOCUMENT_CACHE_MAX_SIZE)
+
+
 class ObjectStore:
 
     def __init__(self, config):
@@ -27,8 +344,11 @@ class ObjectStore:
         super().__init__()
 
     def get_connection(self):
-        connection = objectstore.get_connection(self.config)
-        return connection
+        return connection_pool.get_connection(self.config)
+
+    @staticmethod
+    def reset_connections():
+        connection_pool.reset()
 
     def upload(self, file, document: Document):
         logger.info(f"Uploading {file} to objectstore: {document.filename}")
@@ -36,6 +356,7 @@ class ObjectStore:
 
         container_path = ObjectStore.get_container_path(document.type)
         connection.put_object(container_path, document.filename, file)
+        get_document_cache().invalidate(container_path, document.filename)
         logger.info("Done uploading to objectstore")
 
     def delete(self, document: Document):
@@ -43,6 +364,7 @@ class ObjectStore:
         connection = self.get_connection()
 
         container_path = ObjectStore.get_container_path(document.type)
+        get_document_cache().invalidate(container_path, document.filename)
         try:
             connection.delete_object(container_path, document.filename)
         except ClientException:
@@ -50,9 +372,24 @@ class ObjectStore:
 
         logger.info("Done deleting file from objectstore")
 
-    def get_document(self, connection, container_name: str, object_name: str):
+    def get_document(self, connection, container_name: str, object_name: str, chunk_size: int = None,
+                     headers: dict = None):
+        """
+        Fetch a document from the object store.
+        :param chunk_size: if given, the contents are returned as a generator of chunks
+        of at most this size, instead of as bytes
+        :param headers: extra request headers, e.g. a Range header
+        :return: tuple of the response headers and the contents
+        """
         logger.debug(f'Fetching file from objectstore: {container_name}, {object_name}')
-        return connection.get_object(container_name, object_name)
+        return connection.get_object(container_name, object_name, resp_chunk_size=chunk_size, headers=headers)
+
+    def get_document_headers(self, connection, container_name: str, object_name: str) -> dict:
+        """
+        Fetch the headers of a document, such as the etag and last-modified, without its contents.
+        """
+        logger.debug(f'Fetching file headers from objectstore: {container_name}, {object_name}')
+        return connection.head_object(container_name, object_name)
 
     def get_wba_documents_list(self, connection) -> DocumentList:
         """
@@ -68,25 +405,55 @@ class ObjectStore:
         ]
         return list(map(os.path.split, documents_paths))
 
-    def get_file(self, connection, container_name, object_name):
+    def get_file(self, connection, container_name, object_name, etag=None):
+        """
+        Download an object to DOWNLOAD_DIR, or use the previously downloaded file if it
+        is still the current version of the object.
+
+        A metadata file next to the download records the etag and size of the downloaded
+        object. The download is written to a temporary file and only renamed once it is
+        complete, so a crashed download is never mistaken for the object.
+        :param etag: current etag of the object, if known. Otherwise it is fetched with a HEAD request.
+        """
         os.makedirs(DOWNLOAD_DIR, exist_ok=True)
         output_path = os.path.join(DOWNLOAD_DIR, object_name)
+        metadata_path = f'{output_path}.json'
+
+        if etag is None:
+            etag = connection.head_object(container_name, object_name).get('etag')
 
-        if os.path.isfile(output_path):
+        metadata = read_json_file(metadata_path)
+        if etag and metadata.get('etag') == etag and get_file_size(output_path) == metadata.get('size'):
             logger.info(f"Using cached file: {object_name}")
-        else:
-            logger.info(f"Fetching file: {object_name}")
-            new_data = connection.get_object(container_name, object_name)[1]
-            with open(output_path, 'wb') as file:
-                file.write(new_data)
+            return output_path
+
+        logger.info(f"Fetching file: {object_name}")
+        headers, chunks = connection.get_object(container_name, object_name, resp_chunk_size=DOWNLOAD_CHUNK_SIZE)
+        if os.path.exists(metadata_path):
+            os.remove(metadata_path)
+        size = write_file_atomic(output_path, chunks)
+
+        if 'content-length' in headers and int(headers['content-length']) != size:
+            os.remove(output_path)
+            raise IOError(f"Incomplete download of {object_name}: got {size} of {headers['content-length']} bytes")
+
+        write_file_atomic(metadata_path, [json.dumps({
+            'etag': headers.get('etag'),
+            'size': size,
+            'fetched_at': datetime.now().isoformat(),
+        }).encode('utf-8')])
         return output_path
 
-    def fetch_spots(self, connection):
-        return self.get_file(connection, WBA_CONTAINER_NAME, XLS_OBJECT_NAME)
+    def fetch_spots(self, connection, etag=None):
+        return self.get_file(connection, WBA_CONTAINER_NAME, XLS_OBJECT_NAME, etag=etag)
+
+    def get_spots_etag(self, connection) -> str:
+        """
+        Get the ETag (md5 of the contents) of the spots xls file, without downloading it.
+        """
+        headers = connection.head_object(WBA_CONTAINER_NAME, XLS_OBJECT_NAME)
+        return headers.get('etag')
 
     @staticmethod
     def get_container_path(document_type):
-        if document_type == Document.DocumentType.Ontwerp:
-            return f'{settings.OBJECTSTORE_UPLOAD_CONTAINER_NAME}/doc/ontwerp'
-        else:
-            return f'{settings.OBJECTSTORE_UPLOAD_CONTAINER_NAME}/doc/rapportage'
+        return f'{settings.OBJECTSTORE_UPLOAD_CONTAINER_NAME}/doc/{get_document_folder(document_type)}'
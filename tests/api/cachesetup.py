@@ -0,0 +1,23 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test import override_settings
+
+
+class CacheSetup(object):
+    """
+    Helper method to give file based caches a temporary location for the current test,
+    so cached content does not leak between tests, or into the real cache
+    """
+
+    def setup_caches(self, *names):
+        caches = {**settings.CACHES}
+        for name in names:
+            directory = tempfile.mkdtemp()
+            self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+            caches[name] = {**settings.CACHES[name], 'LOCATION': directory}
+
+        override = override_settings(CACHES=caches)
+        override.enable()
+        self.addCleanup(override.disable)
@@ -1,19 +1,24 @@
+import json
 import logging
 from unittest import mock
 
+from django.db import connection
 from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from model_bakery import baker, seq
 from rest_framework.reverse import reverse
 from rest_framework.test import APIClient
 
+from api.snapshots import CACHE_NAME
 from datasets.blackspots import models
-from datasets.blackspots.models import Document, Spot
+from datasets.blackspots.models import DataVersion, Document, Spot
 from tests.api.authzsetup import AuthorizationSetup
+from tests.api.cachesetup import CacheSetup
 
 log = logging.getLogger(__name__)
 
 
-class TestAPIEndpoints(TransactionTestCase, AuthorizationSetup):
+class TestAPIEndpoints(TransactionTestCase, AuthorizationSetup, CacheSetup):
     """
     Verifies that browsing the API works correctly.
     """
@@ -21,6 +26,7 @@ class TestAPIEndpoints(TransactionTestCase, AuthorizationSetup):
 
     def setUp(self):
         self.setup_clients()
+        self.setup_caches(CACHE_NAME)
 
         # generate 3 spots with locatie_ids test_1, test_2 and test_3
         baker.prepare(Document)  # because of this line the next bakery will work
@@ -48,6 +54,25 @@ class TestAPIEndpoints(TransactionTestCase, AuthorizationSetup):
                 "Wrong Content-Type for {}".format(url),
             )
 
+    def assertConstantQueryCount(self, url):
+        """
+        Helper method to check that the number of queries does not grow with the number of spots and documents
+        """
+        DataVersion.get_version()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.read_client.get(url)
+        self.assertEqual(200, response.status_code)
+
+        for spot in baker.make(Spot, _quantity=3):
+            baker.make(Document, spot=spot, _quantity=2)
+        # rebuild the geojson snapshot
+        DataVersion.bump()
+
+        with CaptureQueriesContext(connection) as more_queries:
+            response = self.read_client.get(url)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(len(queries), len(more_queries), f"Query count for {url} depends on the number of spots")
+
     def test_setup(self):
         self.assertEqual(models.Spot.objects.count(), 4)
         self.assertEqual(models.Document.objects.count(), 3)
@@ -67,6 +92,12 @@ class TestAPIEndpoints(TransactionTestCase, AuthorizationSetup):
         ][0]
         self.assertEqual(len(spot_document_data.get("documents")), 3)
 
+    def test_spot_list_query_count(self):
+        self.assertConstantQueryCount(reverse("spot-list"))
+
+    def test_spot_list_geojson_query_count(self):
+        self.assertConstantQueryCount(reverse("spot-list", format="geojson"))
+
     def test_spot_list_auth_error(self):
         url = reverse("spot-list")
 
@@ -80,7 +111,7 @@ class TestAPIEndpoints(TransactionTestCase, AuthorizationSetup):
         response = self.read_client.get(url)
 
         self.assertStatusCode(url, response)
-        data = response.data
+        data = json.loads(response.content)
         self.assertEqual(data.get("type"), "FeatureCollection")
         self.assertEqual(len(data.get("features")), 4)
 
@@ -282,6 +313,9 @@ class TestAPIEndpoints(TransactionTestCase, AuthorizationSetup):
         self.assertStatusCode(url, response)
         self.assertEqual(len(response.data), 3)
 
+    def test_documents_list_query_count(self):
+        self.assertConstantQueryCount(reverse("document-list"))
+
     def test_documents_list_auth_error(self):
         url = reverse("document-list")
         for client in [self.anon_client, self.write_client]:
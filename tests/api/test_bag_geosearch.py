@@ -1,13 +1,22 @@
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 from unittest import TestCase
 from unittest.mock import Mock, patch
 
+from django.test import override_settings
 from requests import ConnectionError, HTTPError, Timeout, TooManyRedirects
 
 from api.bag_geosearch import BagGeoSearchAPI
 from datasets.blackspots.models import Spot
+from tests.api.cachesetup import CacheSetup
 
 
-class TestBagGeoSearchAPI(TestCase):
+class TestBagGeoSearchAPI(TestCase, CacheSetup):
+
+    def setUp(self):
+        # the results of the mocked requests must not leak between tests, or into the real cache
+        self.setup_caches(BagGeoSearchAPI.CACHE_NAME, BagGeoSearchAPI.STATS_CACHE_NAME)
+        BagGeoSearchAPI.reset_cache_stats()
 
     @patch('api.bag_geosearch.requests')
     def test_get_stadsdeel(self, mocked_requests):
@@ -125,3 +134,81 @@ class TestBagGeoSearchAPI(TestCase):
             expected_stadsdeel = Spot.Stadsdelen.BagFout
             stadsdeel = BagGeoSearchAPI().get_stadsdeel(lat=52.370216, lon=4.895168)
             self.assertEqual(stadsdeel, expected_stadsdeel)
+
+    @patch('api.bag_geosearch.requests')
+    def test_get_stadsdeel_cached(self, mocked_requests):
+        """
+        Test and assert that the same, or almost the same, point is only requested once
+        """
+        mocked_response = Mock()
+        mocked_response.json.return_value = {
+            "features": [{"properties": {"code": "A", "type": "gebieden/stadsdeel"}}],
+        }
+        mocked_requests.get.return_value = mocked_response
+
+        api = BagGeoSearchAPI()
+        self.assertEqual(api.get_stadsdeel(lat=52.370216, lon=4.895168), Spot.Stadsdelen.Centrum)
+        self.assertEqual(api.get_stadsdeel(lat=52.370216, lon=4.895168), Spot.Stadsdelen.Centrum)
+        self.assertEqual(api.get_stadsdeel(lat=52.3702162, lon=4.8951681), Spot.Stadsdelen.Centrum)
+
+        self.assertEqual(mocked_requests.get.call_count, 1)
+        self.assertEqual(BagGeoSearchAPI.get_cache_stats(), {'hits': 2, 'misses': 1})
+
+    @patch('api.bag_geosearch.requests')
+    def test_get_stadsdeel_negative_cached(self, mocked_requests):
+        """
+        Test and assert that points outside of Amsterdam are cached with the negative timeout
+        """
+        mocked_response = Mock()
+        mocked_response.json.return_value = {}
+        mocked_requests.get.return_value = mocked_response
+
+        with override_settings(BAG_GEO_SEARCH_CACHE_NEGATIVE_TIMEOUT=123):
+            with patch.object(BagGeoSearchAPI.get_cache(), 'set') as mocked_set:
+                BagGeoSearchAPI().get_stadsdeel(lat=52.0, lon=4.0)
+
+        mocked_set.assert_called_with(BagGeoSearchAPI.get_cache_key(52.0, 4.0), Spot.Stadsdelen.Geen, timeout=123)
+
+    @patch('api.bag_geosearch.requests')
+    def test_get_stadsdeel_error_not_cached(self, mocked_requests):
+        """
+        Test and assert that errors are not cached, so the next lookup is requested again
+        """
+        mocked_requests.get.side_effect = ConnectionError()
+
+        api = BagGeoSearchAPI()
+        self.assertEqual(api.get_stadsdeel(lat=52.370216, lon=4.895168), Spot.Stadsdelen.BagFout)
+        self.assertEqual(api.get_stadsdeel(lat=52.370216, lon=4.895168), Spot.Stadsdelen.BagFout)
+
+        self.assertEqual(mocked_requests.get.call_count, 2)
+        self.assertEqual(BagGeoSearchAPI.get_cache_stats(), {'hits': 0, 'misses': 2})
+
+    def test_count_concurrent(self):
+        """
+        Test and assert that no counts are lost when threads count at the same time
+        """
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            for _ in range(8):
+                executor.submit(lambda: [BagGeoSearchAPI.count('hits') for _ in range(1000)])
+
+        self.assertEqual(BagGeoSearchAPI.get_cache_stats(), {'hits': 8000, 'misses': 0})
+
+    def test_count_other_process(self):
+        """
+        Test and assert that the counts of another process, like a uwsgi worker, can be read
+        """
+        process = multiprocessing.get_context('fork').Process(
+            target=lambda: [BagGeoSearchAPI.count(stat) for stat in ('hits', 'hits', 'misses')])
+        process.start()
+        process.join()
+
+        self.assertEqual(process.exitcode, 0)
+        self.assertEqual(BagGeoSearchAPI.get_cache_stats(), {'hits': 2, 'misses': 1})
+
+    @override_settings(BAG_GEO_SEARCH_CACHE_PRECISION=3)
+    def test_get_cache_key(self):
+        self.assertEqual(BagGeoSearchAPI.get_cache_key(52.370216, 4.895168), 'stadsdeel:52.370:4.895')
+        self.assertEqual(
+            BagGeoSearchAPI.get_cache_key(52.370216, 4.895168),
+            BagGeoSearchAPI.get_cache_key(52.3699, 4.8954)
+        )
@@ -1,18 +1,21 @@
 import logging
+import tempfile
 from unittest.mock import patch
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from model_bakery import baker
 from rest_framework.reverse import reverse
 from swiftclient import ClientException
 
 from datasets.blackspots import models
 from datasets.blackspots.models import Document
+from storage.objectstore import DOCUMENT_CHUNK_SIZE
 from tests.api.authzsetup import AuthorizationSetup
 
 log = logging.getLogger(__name__)
 
 
+@override_settings(DOCUMENT_CACHE_MAX_SIZE=0)
 class TestDocumentProxy(TestCase, AuthorizationSetup):
     """
     Verifies objectstore proxy working correctly
@@ -36,17 +39,136 @@ class TestDocumentProxy(TestCase, AuthorizationSetup):
     def test_get_document(self, get_mock, connection_mock):
         connection_mock.return_value = 'connection_object'
         get_mock.return_value = [
-            {'content-type': 'application/pdf'},
-            'blob'
+            {'content-type': 'application/pdf', 'content-length': '4', 'etag': 'abc',
+             'last-modified': 'Wed, 21 Oct 2020 07:28:00 GMT'},
+            iter([b'bl', b'ob'])
         ]
 
         response = self.read_client.get(reverse('document-get-file', [self.document.id]))
 
         # note, container name test is defined in the environment OBJECTSTORE_UPLOAD_CONTAINER_NAME
-        get_mock.assert_called_with('connection_object', 'test/doc/ontwerp', 'foo.pdf')
+        get_mock.assert_called_with('connection_object', 'test/doc/ontwerp', 'foo.pdf',
+                                    chunk_size=DOCUMENT_CHUNK_SIZE, headers=None)
         self.assertEqual(200, response.status_code)
+        self.assertTrue(response.streaming)
         self.assertEqual('application/pdf', response['Content-Type'])
-        self.assertEqual(response.content, b'blob')
+        self.assertEqual('4', response['Content-Length'])
+        self.assertEqual('"abc"', response['ETag'])
+        self.assertEqual('Wed, 21 Oct 2020 07:28:00 GMT', response['Last-Modified'])
+        self.assertEqual('bytes', response['Accept-Ranges'])
+        self.assertEqual(b''.join(response.streaming_content), b'blob')
+
+    @patch('storage.objectstore.ObjectStore.get_connection')
+    @patch('storage.objectstore.ObjectStore.get_document')
+    def test_get_document_range(self, get_mock, connection_mock):
+        """
+        Test and assert that the range is requested from the object store, and answered with a 206
+        """
+        connection_mock.return_value = 'connection_object'
+        get_mock.return_value = [
+            {'content-type': 'application/pdf', 'content-length': '2', 'content-range': 'bytes 2-3/4'},
+            iter([b'ob'])
+        ]
+
+        response = self.read_client.get(reverse('document-get-file', [self.document.id]), HTTP_RANGE='bytes=2-')
+
+        get_mock.assert_called_with('connection_object', 'test/doc/ontwerp', 'foo.pdf',
+                                    chunk_size=DOCUMENT_CHUNK_SIZE, headers={'Range': 'bytes=2-'})
+        self.assertEqual(206, response.status_code)
+        self.assertEqual('bytes 2-3/4', response['Content-Range'])
+        self.assertEqual('2', response['Content-Length'])
+        self.assertEqual(b''.join(response.streaming_content), b'ob')
+
+    @patch('storage.objectstore.ObjectStore.get_connection')
+    @patch('storage.objectstore.ObjectStore.get_document_headers')
+    @patch('storage.objectstore.ObjectStore.get_document')
+    def test_get_document_if_range(self, get_mock, headers_mock, connection_mock):
+        """
+        Test and assert that the range is kept when If-Range matches the etag or last modified date
+        """
+        connection_mock.return_value = 'connection_object'
+        headers_mock.return_value = {'etag': 'abc', 'last-modified': 'Wed, 21 Oct 2020 07:28:00 GMT'}
+        get_mock.side_effect = lambda *args, **kwargs: (
+            {'content-type': 'application/pdf', 'content-length': '2', 'content-range': 'bytes 2-3/4'}, iter([b'ob']))
+        url = reverse('document-get-file', [self.document.id])
+
+        for if_range in ['"abc"', 'Wed, 21 Oct 2020 07:28:00 GMT']:
+            response = self.read_client.get(url, HTTP_RANGE='bytes=2-', HTTP_IF_RANGE=if_range)
+
+            get_mock.assert_called_with('connection_object', 'test/doc/ontwerp', 'foo.pdf',
+                                        chunk_size=DOCUMENT_CHUNK_SIZE, headers={'Range': 'bytes=2-'})
+            self.assertEqual(206, response.status_code)
+            self.assertEqual(b''.join(response.streaming_content), b'ob')
+
+    @patch('storage.objectstore.ObjectStore.get_connection')
+    @patch('storage.objectstore.ObjectStore.get_document_headers')
+    @patch('storage.objectstore.ObjectStore.get_document')
+    def test_get_document_if_range_stale(self, get_mock, headers_mock, connection_mock):
+        """
+        Test and assert that the whole document is returned when If-Range does not match,
+        because the document changed since the client's copy
+        """
+        connection_mock.return_value = 'connection_object'
+        headers_mock.return_value = {'etag': 'def', 'last-modified': 'Thu, 22 Oct 2020 07:28:00 GMT'}
+        get_mock.side_effect = lambda *args, **kwargs: (
+            {'content-type': 'application/pdf', 'content-length': '4', 'etag': 'def'}, iter([b'bl', b'ob']))
+        url = reverse('document-get-file', [self.document.id])
+
+        for if_range in ['"abc"', 'W/"def"', 'Wed, 21 Oct 2020 07:28:00 GMT']:
+            response = self.read_client.get(url, HTTP_RANGE='bytes=2-', HTTP_IF_RANGE=if_range)
+
+            get_mock.assert_called_with('connection_object', 'test/doc/ontwerp', 'foo.pdf',
+                                        chunk_size=DOCUMENT_CHUNK_SIZE, headers=None)
+            self.assertEqual(200, response.status_code)
+            self.assertNotIn('Content-Range', response)
+            self.assertEqual('"def"', response['ETag'])
+            self.assertEqual(b''.join(response.streaming_content), b'blob')
+
+    @patch('storage.objectstore.ObjectStore.get_connection')
+    @patch('storage.objectstore.ObjectStore.get_document')
+    def test_get_document_range_not_satisfiable(self, get_mock, connection_mock):
+        connection_mock.return_value = 'connection_object'
+        get_mock.side_effect = ClientException('Object GET failed', http_status=416)
+
+        response = self.read_client.get(reverse('document-get-file', [self.document.id]), HTTP_RANGE='bytes=10-')
+
+        self.assertEqual(416, response.status_code)
+
+    @patch('storage.objectstore.ObjectStore.get_connection')
+    @patch('storage.objectstore.ObjectStore.get_document_headers')
+    @patch('storage.objectstore.ObjectStore.get_document')
+    def test_get_document_not_modified(self, get_mock, headers_mock, connection_mock):
+        """
+        Test and assert that a matching If-None-Match is answered with a 304, without fetching the document
+        """
+        connection_mock.return_value = 'connection_object'
+        headers_mock.return_value = {'etag': 'abc', 'last-modified': 'Wed, 21 Oct 2020 07:28:00 GMT'}
+
+        response = self.read_client.get(reverse('document-get-file', [self.document.id]), HTTP_IF_NONE_MATCH='"abc"')
+
+        headers_mock.assert_called_with('connection_object', 'test/doc/ontwerp', 'foo.pdf')
+        get_mock.assert_not_called()
+        self.assertEqual(304, response.status_code)
+        self.assertEqual('"abc"', response['ETag'])
+
+    @patch('storage.objectstore.ObjectStore.get_connection')
+    @patch('storage.objectstore.ObjectStore.get_document_headers')
+    @patch('storage.objectstore.ObjectStore.get_document')
+    def test_get_document_modified(self, get_mock, headers_mock, connection_mock):
+        """
+        Test and assert that the document is returned when it changed since the client's copy
+        """
+        connection_mock.return_value = 'connection_object'
+        headers_mock.return_value = {'etag': 'def', 'last-modified': 'Wed, 21 Oct 2020 07:28:00 GMT'}
+        get_mock.return_value = [{'content-type': 'application/pdf', 'etag': 'def'}, iter([b'blob'])]
+
+        response = self.read_client.get(reverse('document-get-file', [self.document.id]),
+                                        HTTP_IF_NONE_MATCH='"abc"',
+                                        HTTP_IF_MODIFIED_SINCE='Wed, 21 Oct 2020 07:28:00 GMT')
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('"def"', response['ETag'])
+        self.assertEqual(b''.join(response.streaming_content), b'blob')
 
     @patch('storage.objectstore.ObjectStore.get_connection')
     @patch('storage.objectstore.ObjectStore.get_document')
@@ -80,3 +202,67 @@ class TestDocumentProxy(TestCase, AuthorizationSetup):
         response = self.read_client.get(reverse('document-get-file', [self.document.id]))
 
         self.assertEqual(500, response.status_code)
+
+
+class TestDocumentProxyCache(TestCase, AuthorizationSetup):
+    """
+    Verifies documents are served from the local disk cache
+    """
+
+    def setUp(self):
+        self.setup_clients()
+        self.document = baker.make(Document, type='Ontwerp', filename='foo.pdf')
+
+        cache_settings = override_settings(DOCUMENT_CACHE_DIR=tempfile.mkdtemp(), DOCUMENT_CACHE_MAX_SIZE=1024)
+        cache_settings.enable()
+        self.addCleanup(cache_settings.disable)
+
+    @patch('storage.objectstore.ObjectStore.get_connection')
+    @patch('storage.objectstore.ObjectStore.get_document_headers')
+    @patch('storage.objectstore.ObjectStore.get_document')
+    def test_get_document_cached(self, get_mock, headers_mock, connection_mock):
+        """
+        Test and assert that a document is fetched once, and then served from the cache
+        until its etag changes
+        """
+        connection_mock.return_value = 'connection_object'
+        headers_mock.return_value = {'content-type': 'application/pdf', 'etag': 'abc'}
+        get_mock.side_effect = lambda *args, **kwargs: (
+            {'content-type': 'application/pdf', 'content-length': '4', 'etag': 'abc'}, iter([b'bl', b'ob']))
+        url = reverse('document-get-file', [self.document.id])
+
+        response = self.read_client.get(url)
+        self.assertEqual(b''.join(response.streaming_content), b'blob')
+        self.assertEqual(get_mock.call_count, 1)
+
+        response = self.read_client.get(url)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('application/pdf', response['Content-Type'])
+        self.assertEqual('4', response['Content-Length'])
+        self.assertEqual('"abc"', response['ETag'])
+        self.assertEqual('attachment; filename="foo.pdf"', response['Content-Disposition'])
+        self.assertEqual(b''.join(response.streaming_content), b'blob')
+        self.assertEqual(get_mock.call_count, 1)
+
+        headers_mock.return_value = {'content-type': 'application/pdf', 'etag': 'def'}
+        self.read_client.get(url)
+        self.assertEqual(get_mock.call_count, 2)
+
+    @patch('storage.objectstore.ObjectStore.get_connection')
+    @patch('storage.objectstore.ObjectStore.get_document_headers')
+    @patch('storage.objectstore.ObjectStore.get_document')
+    def test_get_document_range_not_cached(self, get_mock, headers_mock, connection_mock):
+        """
+        Test and assert that range requests bypass the cache
+        """
+        connection_mock.return_value = 'connection_object'
+        get_mock.side_effect = lambda *args, **kwargs: (
+            {'content-type': 'application/pdf', 'content-range': 'bytes 2-3/4', 'etag': 'abc'}, iter([b'ob']))
+        url = reverse('document-get-file', [self.document.id])
+
+        for _ in range(2):
+            response = self.read_client.get(url, HTTP_RANGE='bytes=2-')
+            self.assertEqual(b''.join(response.streaming_content), b'ob')
+
+        headers_mock.assert_not_called()
+        self.assertEqual(get_mock.call_count, 2)
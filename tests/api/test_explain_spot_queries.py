@@ -0,0 +1,70 @@
+from io import StringIO
+from unittest import TestCase as SimpleTestCase
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase
+from model_bakery import baker
+
+from api.management.commands.explain_spot_queries import uses_index
+from datasets.blackspots.models import Spot
+
+
+class TestExplainSpotQueries(TestCase):
+
+    def test_indexes(self):
+        """
+        Test and assert that the filter and ordering columns of spots are indexed
+        """
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Spot._meta.db_table)
+
+        indexes = {name: constraint['columns'] for name, constraint in constraints.items() if constraint['index']}
+        self.assertEqual(indexes['spot_stadsdeel_type_idx'], ['stadsdeel', 'spot_type', 'id'])
+        self.assertEqual(indexes['spot_type_idx'], ['spot_type', 'id'])
+        self.assertEqual(indexes['spot_status_idx'], ['status', 'id'])
+
+    def test_explain_spot_queries(self):
+        """
+        Test and assert that the plan of every query is shown and uses the expected indexes,
+        and the synthetic spots and their statistics are rolled back
+        """
+        spot = baker.make(Spot)
+        out = StringIO()
+
+        call_command('explain_spot_queries', stdout=out)
+
+        output = out.getvalue()
+        for name in ['export, stadsdeel filter', 'list, first page', 'list, status filter', 'list, bbox filter']:
+            self.assertIn(name, output)
+        self.assertIn('list, bbox filter: using blackspots_spot_point_id', output)
+        self.assertNotIn('NOT USING', output)
+        self.assertIn('Execution Time', output)
+        self.assertEqual(list(Spot.objects.all()), [spot])
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s', [Spot._meta.db_table])
+            self.assertLess(cursor.fetchone()[0], 1000)
+
+    def test_explain_spot_queries_index_not_used(self):
+        """
+        Test and assert that the command fails when a plan does not use the expected index
+        """
+        queries = [('list, first page', Spot.objects.order_by('pk')[:20], ['spot_unknown_idx'])]
+
+        with mock.patch('api.management.commands.explain_spot_queries.get_queries', return_value=queries):
+            with self.assertRaisesMessage(CommandError, 'list, first page'):
+                call_command('explain_spot_queries', count=10, stdout=StringIO())
+
+
+class TestUsesIndex(SimpleTestCase):
+
+    def test_uses_index(self):
+        """
+        Test and assert that an index is only found by its full name
+        """
+        plan = 'Index Scan using spot_stadsdeel_type_idx on blackspots_spot'
+        self.assertTrue(uses_index(plan, 'spot_stadsdeel_type_idx'))
+        self.assertFalse(uses_index(plan, 'spot_type_idx'))
+        self.assertFalse(uses_index('Seq Scan on blackspots_spot', 'spot_status_idx'))
@@ -0,0 +1,248 @@
+import json
+from io import BytesIO
+from unittest import mock
+
+import pyarrow.parquet
+from django.contrib.gis.geos import LineString, Point
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from model_bakery import baker
+from openpyxl import load_workbook
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from rest_framework.reverse import reverse
+
+from api.export import get_copy_sql, is_copy_enabled, iter_copy_csv, iter_csv_rows, use_crlf
+from api.renderers import StreamingCSVRenderer
+from api.serializers import SpotCSVSerializer
+from api.views import SpotExportViewSet
+from datasets.blackspots.models import Spot
+from tests.api.authzsetup import AuthorizationSetup
+
+
+class TestSpotExport(TestCase, AuthorizationSetup):
+    """
+    Verifies that the csv export read from the database is identical to that of SpotCSVSerializer
+    """
+
+    def setUp(self):
+        self.setup_clients()
+        # the export has the same url name as the spots list
+        self.url = reverse('spot-list') + 'export/'
+
+        baker.make(Spot, stadsdeel=Spot.Stadsdelen.Centrum, status=Spot.StatusChoice.gereed,
+                   spot_type=Spot.SpotType.blackspot, point=Point(4.893212345678901, 52.373098765432109),
+                   jaar_blackspotlijst=2019, tasks='Verkeerslichten; "slim" afstellen\nen controleren',
+                   notes='Één rijstrook', start_uitvoering=None)
+        baker.make(Spot, stadsdeel=Spot.Stadsdelen.Zuidoost, status=Spot.StatusChoice.onderzoek_ontwerp,
+                   spot_type=Spot.SpotType.protocol_dodelijk, point=Point(4.9470, 52.3125),
+                   jaar_ongeval_quickscan=2020, tasks=None, notes=None)
+        # a value which is not a choice is exported as is
+        baker.make(Spot, stadsdeel='Q', status=Spot.StatusChoice.onbekend, spot_type=Spot.SpotType.wegvak,
+                   point=Point(5, 52), actiehouders='', notes='')
+
+    def render_serializer_csv(self, queryset):
+        serializer = SpotCSVSerializer(queryset, many=True)
+        return ''.join(StreamingCSVRenderer().render(serializer.data, SpotCSVSerializer().get_fields().keys()))
+
+    def test_export_identical_to_serializer(self):
+        """
+        Test and assert that the rows read from the database render to the same csv as the serializer data
+        """
+        queryset = SpotExportViewSet.queryset
+        fieldnames = SpotCSVSerializer().fields.keys()
+
+        for batch_size in [1, 2, 500]:
+            csv = ''.join(StreamingCSVRenderer().render_rows(iter_csv_rows(queryset), fieldnames, batch_size))
+            self.assertEqual(csv, self.render_serializer_csv(queryset), batch_size)
+
+    def test_export_empty(self):
+        """
+        Test and assert that only the header is exported when there are no spots
+        """
+        queryset = SpotExportViewSet.queryset.none()
+        csv = ''.join(StreamingCSVRenderer().render_rows(iter_csv_rows(queryset), SpotCSVSerializer().fields.keys()))
+        self.assertEqual(csv, self.render_serializer_csv(queryset))
+
+    def test_copy_export_identical_to_serializer(self):
+        """
+        Test and assert that the csv written by the database is identical to that of the serializer
+        """
+        if connection.pg_version < 120000:
+            self.skipTest('COPY is only used with Postgres 12 and later')
+
+        fieldnames = SpotCSVSerializer().fields.keys()
+        for queryset in [SpotExportViewSet.queryset, SpotExportViewSet.queryset.filter(stadsdeel='Q')]:
+            with mock.patch('api.export.COPY_CHUNK_SIZE', 10):
+                csv = b''.join(iter_copy_csv(get_copy_sql(queryset), fieldnames))
+            self.assertEqual(csv.decode('utf-8'), self.render_serializer_csv(queryset))
+
+        csv = b''.join(iter_copy_csv(get_copy_sql(SpotExportViewSet.queryset.none()), fieldnames))
+        self.assertEqual(csv.decode('utf-8'), self.render_serializer_csv(SpotExportViewSet.queryset.none()))
+
+    def test_use_crlf(self):
+        """
+        Test and assert that line terminators are replaced, but newlines in quoted values are kept
+        """
+        chunks = [b'a;"b\n""c', b'"""\nd\n', b'"e\n";f\n']
+        converted = []
+        in_quotes = False
+        for chunk in chunks:
+            chunk, in_quotes = use_crlf(chunk, in_quotes)
+            converted.append(chunk)
+        self.assertEqual(b''.join(converted), b'a;"b\n""c"""\r\nd\r\n"e\n";f\r\n')
+        self.assertFalse(in_quotes)
+
+    @override_settings(EXPORT_COPY_ENABLED=False)
+    def test_export_endpoint_without_copy(self):
+        """
+        Test and assert that the export is written in Python when COPY is disabled
+        """
+        self.assertFalse(is_copy_enabled())
+        self.test_export_endpoint()
+
+    def test_export_endpoint(self):
+        """
+        Test and assert that the filtered export is streamed as a csv download
+        """
+        response = self.read_client.get(self.url, {'stadsdeel': Spot.Stadsdelen.Zuidoost})
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('text/csv', response['Content-Type'])
+        self.assertIn(b'wba_export_', response['Content-Disposition'].encode())
+        content = b''.join(response.streaming_content).decode('utf-8')
+        queryset = SpotExportViewSet.queryset.filter(stadsdeel=Spot.Stadsdelen.Zuidoost)
+        self.assertEqual(content, self.render_serializer_csv(queryset))
+
+
+class TestSpotCopyExportCancel(TransactionTestCase):
+
+    def test_cancel(self):
+        """
+        Test and assert that the COPY is stopped when the client goes away, and the connection can still be used
+        """
+        if connection.pg_version < 120000:
+            self.skipTest('COPY is only used with Postgres 12 and later')
+
+        baker.make(Spot, _quantity=50)
+        with mock.patch('api.export.COPY_CHUNK_SIZE', 1), mock.patch('api.export.COPY_QUEUE_SIZE', 1):
+            chunks = iter_copy_csv(get_copy_sql(SpotExportViewSet.queryset), SpotCSVSerializer().fields.keys())
+            next(chunks)
+            next(chunks)
+            chunks.close()
+
+        self.assertEqual(Spot.objects.count(), 50)
+
+
+class TestSpotExportConnection(TransactionTestCase):
+
+    def get_extra_float_digits(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SHOW extra_float_digits')
+            return cursor.fetchone()[0]
+
+    def test_extra_float_digits_local(self):
+        """
+        Test and assert that the exact coordinates of the export do not change the setting of the connection
+        """
+        baker.make(Spot, point=Point(4.893212345678901, 52.373098765432109))
+        extra_float_digits = self.get_extra_float_digits()
+
+        rows = list(iter_csv_rows(SpotExportViewSet.queryset))
+
+        fieldnames = list(SpotCSVSerializer().fields.keys())
+        self.assertEqual(rows[0][fieldnames.index('latitude')], 52.373098765432109)
+        self.assertEqual(self.get_extra_float_digits(), extra_float_digits)
+
+    @mock.patch('api.export.FETCH_SIZE', 1)
+    def test_partly_consumed(self):
+        """
+        Test and assert that no transaction is kept open while a streamed export waits for the client
+        """
+        baker.make(Spot, _quantity=3)
+        extra_float_digits = self.get_extra_float_digits()
+
+        rows = iter_csv_rows(SpotExportViewSet.queryset)
+        next(rows)
+
+        self.assertTrue(connection.get_autocommit())
+        self.assertFalse(connection.in_atomic_block)
+        self.assertEqual(connection.connection.get_transaction_status(), TRANSACTION_STATUS_IDLE)
+
+        # the cursor is held outside of a transaction, so the export goes on after other queries
+        self.assertEqual(Spot.objects.count(), 3)
+        self.assertEqual(len(list(rows)), 2)
+        self.assertEqual(self.get_extra_float_digits(), extra_float_digits)
+
+
+class TestSpotExportFormats(TestCase, AuthorizationSetup):
+    """
+    Verifies the xlsx, GeoJSON text sequence and parquet exports
+    """
+
+    def setUp(self):
+        self.setup_clients()
+        self.url = reverse('spot-list') + 'export/'
+
+        baker.make(Spot, locatie_id='wegvak', stadsdeel=Spot.Stadsdelen.Centrum, spot_type=Spot.SpotType.wegvak,
+                   point=Point(4.89, 52.37), wegvak=LineString((4.88, 52.36), (4.90, 52.38)),
+                   jaar_blackspotlijst=2019, notes='=SUM(A1:A2)')
+        baker.make(Spot, locatie_id='punt', stadsdeel=Spot.Stadsdelen.Centrum, spot_type=Spot.SpotType.wegvak,
+                   point=Point(4.9, 52.3))
+        baker.make(Spot, locatie_id='oost', stadsdeel=Spot.Stadsdelen.Oost, point=Point(4.95, 52.36))
+        self.params = {'stadsdeel': Spot.Stadsdelen.Centrum}
+
+    def get_content(self, format):
+        response = self.read_client.get(f'{self.url}{format}/', self.params)
+        self.assertEqual(200, response.status_code)
+        self.assertIn(f'.{format if format != "geojsonseq" else "geojsons"};', response['Content-Disposition'])
+        return b''.join(response.streaming_content)
+
+    def test_xlsx(self):
+        """
+        Test and assert that the filtered spots are exported with their wegvak, and strings are not formulas
+        """
+        sheet = load_workbook(BytesIO(self.get_content('xlsx'))).active
+        rows = list(sheet.values)
+
+        self.assertEqual(list(rows[0]), list(SpotCSVSerializer().fields.keys()) + ['wegvak'])
+        self.assertEqual([row[2] for row in rows[1:]], ['wegvak', 'punt'])
+        self.assertEqual(rows[1][-1], 'LINESTRING(4.88 52.36,4.9 52.38)')
+        self.assertIsNone(rows[2][-1])
+        notes = rows[0].index('aantekeningen')
+        self.assertEqual(sheet.cell(row=2, column=notes + 1).data_type, 's')
+
+    def test_geojsonseq(self):
+        """
+        Test and assert that every filtered spot is a feature of its point, with the wegvak as a property
+        """
+        content = self.get_content('geojsonseq').decode('utf-8')
+        self.assertTrue(content.startswith('\x1e'))
+        features = [json.loads(record) for record in content.split('\x1e')[1:]]
+
+        self.assertEqual([feature['properties']['nummer'] for feature in features], ['wegvak', 'punt'])
+        self.assertEqual(features[0]['properties']['stadsdeel'], 'Centrum')
+        self.assertEqual(features[0]['geometry'], {'type': 'Point', 'coordinates': [4.89, 52.37]})
+        self.assertEqual(features[0]['properties']['wegvak'],
+                         {'type': 'LineString', 'coordinates': [[4.88, 52.36], [4.9, 52.38]]})
+        self.assertEqual(features[1]['geometry'], {'type': 'Point', 'coordinates': [4.9, 52.3]})
+        self.assertIsNone(features[1]['properties']['wegvak'])
+
+    def test_parquet(self):
+        """
+        Test and assert that the filtered spots are exported as typed columns
+        """
+        table = pyarrow.parquet.read_table(BytesIO(self.get_content('parquet')))
+
+        self.assertEqual(table.column_names, list(SpotCSVSerializer().fields.keys()) + ['wegvak'])
+        self.assertEqual(table.column('nummer').to_pylist(), ['wegvak', 'punt'])
+        self.assertEqual(table.column('jaar_blackspotlijst').to_pylist(), [2019, None])
+        self.assertEqual(table.column('latitude').to_pylist(), [52.37, 52.3])
+        self.assertEqual(table.schema.field('latitude').type, pyarrow.float64())
+
+    @mock.patch('api.export.PARQUET_ROW_GROUP_SIZE', 1)
+    def test_parquet_row_groups(self):
+        """
+        Test and assert that the parquet export is written a row group at a time
+        """
+        parquet_file = pyarrow.parquet.ParquetFile(BytesIO(self.get_content('parquet')))
+        self.assertEqual(parquet_file.num_row_groups, 2)
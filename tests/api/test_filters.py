@@ -0,0 +1,98 @@
+import json
+
+from django.contrib.gis.geos import LineString, Point
+from django.db import connection
+from django.test import TestCase
+from model_bakery import baker
+from rest_framework.reverse import reverse
+
+from datasets.blackspots.models import Spot
+from tests.api.authzsetup import AuthorizationSetup
+
+
+class TestSpotSpatialFilter(TestCase, AuthorizationSetup):
+    """
+    Verifies the bbox and near filters of the spots endpoint
+    """
+
+    def setUp(self):
+        self.setup_clients()
+        self.url = reverse('spot-list')
+
+        baker.make(Spot, locatie_id='dam', point=Point(4.8932, 52.3731))
+        baker.make(Spot, locatie_id='centraal', point=Point(4.9003, 52.3789))
+        baker.make(Spot, locatie_id='zuidoost', point=Point(4.9470, 52.3125))
+        # the point lies outside the centre, but the wegvak crosses it
+        baker.make(Spot, locatie_id='wegvak', point=Point(4.85, 52.36),
+                   wegvak=LineString((4.85, 52.36), (4.895, 52.375)))
+
+    def get_locatie_ids(self, params, url=None):
+        response = self.read_client.get(url or self.url, params)
+        self.assertEqual(200, response.status_code)
+        if response.streaming:
+            features = json.loads(b''.join(response.streaming_content))['features']
+            return {feature['properties']['locatie_id'] for feature in features}
+        return {spot['locatie_id'] for spot in response.data['results']}
+
+    def test_bbox(self):
+        """
+        Test and assert that spots of which the point or wegvak overlaps the bbox are returned
+        """
+        self.assertEqual(self.get_locatie_ids({'bbox': '4.89,52.37,4.91,52.38'}), {'dam', 'centraal', 'wegvak'})
+        self.assertEqual(self.get_locatie_ids({'bbox': '4.94,52.31,4.95,52.32'}), {'zuidoost'})
+
+    def test_bbox_geojson(self):
+        url = reverse('spot-list', format='geojson')
+        self.assertEqual(self.get_locatie_ids({'bbox': '4.94,52.31,4.95,52.32'}, url=url), {'zuidoost'})
+
+    def test_near(self):
+        """
+        Test and assert that only spots within radius meters of the location are returned
+        """
+        # the Dam and Centraal station are about 800 meters apart
+        self.assertEqual(self.get_locatie_ids({'near': '52.3731,4.8932', 'radius': 500}), {'dam'})
+        self.assertEqual(self.get_locatie_ids({'near': '52.3731,4.8932', 'radius': 1000}), {'dam', 'centraal'})
+
+    def test_combined_with_filters(self):
+        Spot.objects.filter(locatie_id='dam').update(stadsdeel=Spot.Stadsdelen.Centrum)
+        Spot.objects.exclude(locatie_id='dam').update(stadsdeel=Spot.Stadsdelen.Noord)
+
+        params = {'bbox': '4.89,52.37,4.91,52.38', 'stadsdeel': Spot.Stadsdelen.Centrum}
+        self.assertEqual(self.get_locatie_ids(params), {'dam'})
+
+    def test_combined_with_ordering(self):
+        """
+        Test and assert that ?ordering= is applied together with the filters, for json and geojson
+        """
+        params = {'bbox': '4.89,52.37,4.91,52.38', 'ordering': '-locatie_id'}
+        for url in [self.url, reverse('spot-list', format='geojson')]:
+            response = self.read_client.get(url, params)
+            data = json.loads(b''.join(response.streaming_content))
+            locatie_ids = [spot['properties']['locatie_id'] for spot in data['features']] if 'features' in data \
+                else [spot['locatie_id'] for spot in data['results']]
+            self.assertEqual(locatie_ids, ['wegvak', 'dam', 'centraal'], url)
+
+    def test_invalid(self):
+        for params in [
+            {'bbox': '4.89,52.37,4.91'},
+            {'bbox': '4.91,52.37,4.89,52.38'},
+            {'bbox': 'a,b,c,d'},
+            {'near': '52.3731'},
+            {'near': '52.3731,4.8932'},
+            {'near': '52.3731,4.8932', 'radius': '-1'},
+            {'near': '52.3731,4.8932', 'radius': 'nan'},
+        ]:
+            response = self.read_client.get(self.url, params)
+            self.assertEqual(400, response.status_code, params)
+
+    def test_spatial_indexes(self):
+        """
+        Test and assert that the point and wegvak columns have a GiST index
+        """
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, Spot._meta.db_table)
+
+        gist_columns = [constraint['columns'] for constraint in constraints.values()
+                        if constraint['index'] and constraint['type'] == 'gist']
+        self.assertIn(['point'], gist_columns)
+        self.assertIn(['wegvak'], gist_columns)
@@ -0,0 +1,73 @@
+from django.contrib.gis.geos import LineString, Point
+from django.db.models import Prefetch
+from django.test import RequestFactory, TestCase
+from model_bakery import baker
+
+from api.geojson import iter_geojson
+from api.renderers import GeojsonRenderer
+from api.serializers import SpotGeojsonSerializer
+from datasets.blackspots.models import Document, Spot
+
+
+class TestIterGeojson(TestCase):
+    """
+    Verifies the geojson built by the database is identical to the geojson of the serializer
+    """
+
+    def setUp(self):
+        self.request = RequestFactory().get('/')
+        baker.make(
+            Spot,
+            locatie_id='B1',
+            stadsdeel=Spot.Stadsdelen.Nieuw_West,
+            point=Point(4.9239022, 52.3875654),
+            wegvak=LineString((4.9, 52.37), (4.91, 52.38123)),
+            description='Kruising "Ĳsbaan" \\ weg\n\tmet regels',
+            tasks=None,
+            notes='Regel\u2028scheiding',
+            jaar_blackspotlijst=2019,
+            jaar_oplevering=None,
+        )
+        spot = baker.make(
+            Spot,
+            locatie_id='B2',
+            stadsdeel=Spot.Stadsdelen.BagFout,
+            point=Point(4.8, 52.1),
+            wegvak=None,
+            tasks='Taken',
+        )
+        baker.make(Document, spot=spot, type=Document.DocumentType.Rapportage, filename='B2_rapportage.pdf')
+        baker.make(Document, spot=spot, type=Document.DocumentType.Ontwerp, filename="B2_ontwerp 'x'.pdf")
+
+    def serialize(self, queryset):
+        queryset = queryset.prefetch_related(Prefetch('documents', queryset=Document.objects.order_by('pk')))
+        serializer = SpotGeojsonSerializer(queryset, many=True, context={'request': self.request})
+        return GeojsonRenderer().render(serializer.data)
+
+    def test_iter_geojson(self):
+        """
+        Test and assert that the output is byte for byte the same as rendering the serializer
+        """
+        queryset = Spot.objects.order_by('pk')
+
+        with self.assertNumQueries(1):
+            content = ''.join(iter_geojson(queryset, self.request)).encode('utf-8')
+
+        self.assertEqual(content, self.serialize(queryset))
+
+    def test_iter_geojson_filtered(self):
+        queryset = Spot.objects.filter(locatie_id='B2').order_by('pk')
+        self.assertEqual(''.join(iter_geojson(queryset, self.request)).encode('utf-8'), self.serialize(queryset))
+
+    def test_iter_geojson_ordering(self):
+        """
+        Test and assert that the features are in the ordering of the queryset
+        """
+        for ordering in [('-locatie_id',), ('stadsdeel', 'pk')]:
+            queryset = Spot.objects.order_by(*ordering)
+            self.assertEqual(
+                ''.join(iter_geojson(queryset, self.request)).encode('utf-8'), self.serialize(queryset), ordering)
+
+    def test_iter_geojson_empty(self):
+        queryset = Spot.objects.none()
+        self.assertEqual(''.join(iter_geojson(queryset, self.request)), '{"type":"FeatureCollection","features":[]}')
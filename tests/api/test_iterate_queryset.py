@@ -0,0 +1,33 @@
+from django.test import TestCase
+from model_bakery import baker
+
+from api.serializers import iterate_queryset
+from datasets.blackspots.models import Document, Spot
+
+
+class TestIterateQueryset(TestCase):
+
+    def setUp(self):
+        for spot in baker.make(Spot, _quantity=5):
+            baker.make(Document, spot=spot, _quantity=2)
+
+    def test_iterate_queryset(self):
+        """
+        Test and assert that all objects are returned in order, with their related objects prefetched per chunk
+        """
+        queryset = Spot.objects.prefetch_related('documents').order_by('pk')
+
+        # a query for the spots, and a query for the documents of each of the 3 chunks
+        with self.assertNumQueries(4):
+            spots = list(iterate_queryset(queryset, chunk_size=2))
+            document_counts = [len(spot.documents.all()) for spot in spots]
+
+        self.assertEqual([spot.pk for spot in spots], list(Spot.objects.order_by('pk').values_list('pk', flat=True)))
+        self.assertEqual(document_counts, [2] * 5)
+
+    def test_iterate_queryset_without_prefetch(self):
+        """
+        Test and assert that a queryset without prefetch lookups is iterated as is
+        """
+        with self.assertNumQueries(1):
+            self.assertEqual(len(list(iterate_queryset(Spot.objects.all(), chunk_size=2))), 5)
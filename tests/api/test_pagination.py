@@ -0,0 +1,106 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from model_bakery import baker, seq
+from rest_framework.reverse import reverse
+
+from datasets.blackspots.models import Document, Spot
+from tests.api.authzsetup import AuthorizationSetup
+
+
+class TestHALCursorPagination(TestCase, AuthorizationSetup):
+    """
+    Verifies the keyset pagination of the spots and documents endpoints
+    """
+
+    def setUp(self):
+        self.setup_clients()
+        self.url = reverse('spot-list')
+
+        stadsdelen = [Spot.Stadsdelen.Centrum, Spot.Stadsdelen.Oost, Spot.Stadsdelen.Zuid]
+        for idx in range(10):
+            baker.make(Spot, locatie_id=f'spot_{idx}', stadsdeel=stadsdelen[idx % 3],
+                       jaar_oplevering=None if idx % 4 == 0 else 2000 + idx % 3)
+
+    def walk(self, params):
+        """
+        Follow the next links, and then the previous links back to the first page
+        :return: list of the pages, as lists of locatie_ids
+        """
+        pages = []
+        response = self.read_client.get(self.url, params)
+        while True:
+            self.assertEqual(200, response.status_code)
+            pages.append([spot['locatie_id'] for spot in response.data['results']])
+            next_link = response.data['_links']['next']['href']
+            if next_link is None:
+                break
+            response = self.read_client.get(next_link)
+
+        previous_pages = [pages[-1]]
+        while response.data['_links']['previous']['href']:
+            response = self.read_client.get(response.data['_links']['previous']['href'])
+            self.assertEqual(200, response.status_code)
+            previous_pages.insert(0, [spot['locatie_id'] for spot in response.data['results']])
+
+        self.assertEqual(pages, previous_pages)
+        return pages
+
+    def test_pages(self):
+        """
+        Test and assert that following the links returns every spot once, in the order of the primary key
+        """
+        pages = self.walk({'page_size': 3})
+
+        self.assertEqual([len(page) for page in pages], [3, 3, 3, 1])
+        self.assertEqual(sum(pages, []), [f'spot_{idx}' for idx in range(10)])
+
+    def test_pages_ordering(self):
+        """
+        Test and assert that the pages follow the ordering, also on duplicate and null values
+        """
+        for ordering in ['stadsdeel', '-stadsdeel', 'jaar_oplevering', '-jaar_oplevering,stadsdeel']:
+            locatie_ids = sum(self.walk({'page_size': 3, 'ordering': ordering}), [])
+
+            expected = Spot.objects.order_by(*ordering.split(','), 'pk')
+            self.assertEqual(locatie_ids, [spot.locatie_id for spot in expected], ordering)
+
+    def test_count(self):
+        """
+        Test and assert that the count is included, unless disabled, which saves a query
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.read_client.get(self.url, {'page_size': 3})
+        self.assertEqual(response.data['count'], 10)
+
+        with CaptureQueriesContext(connection) as queries_without_count:
+            response = self.read_client.get(self.url, {'page_size': 3, 'count': 'false'})
+        self.assertNotIn('count', response.data)
+        self.assertEqual(len(queries_without_count), len(queries) - 1)
+
+    def test_invalid_cursor(self):
+        """
+        Test and assert that an invalid cursor results in a 404
+        """
+        response = self.read_client.get(self.url, {'cursor': 'invalid'})
+        self.assertEqual(404, response.status_code)
+
+    def test_documents(self):
+        """
+        Test and assert that the documents are paginated on their primary key
+        """
+        spot = baker.make(Spot)
+        baker.make(Document, spot=spot, filename=seq('document_'), _quantity=5)
+
+        response = self.read_client.get(reverse('document-list'), {'page_size': 2})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(response.data['count'], 5)
+
+        filenames = []
+        while True:
+            filenames += [document['filename'] for document in response.data['results']]
+            if response.data['_links']['next']['href'] is None:
+                break
+            response = self.read_client.get(response.data['_links']['next']['href'])
+
+        self.assertEqual(filenames, [f'document_{idx}' for idx in range(1, 6)])
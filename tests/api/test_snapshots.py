@@ -0,0 +1,98 @@
+import gzip
+import json
+from unittest import mock
+
+from django.test import TestCase
+from model_bakery import baker
+from rest_framework.reverse import reverse
+
+from api.snapshots import CACHE_NAME
+from datasets.blackspots.models import DataVersion, Document, Spot
+from tests.api.authzsetup import AuthorizationSetup
+from tests.api.cachesetup import CacheSetup
+
+
+class TestGeojsonSnapshot(TestCase, AuthorizationSetup, CacheSetup):
+    """
+    Verifies the full map geojson is served from a snapshot per data version
+    """
+
+    def setUp(self):
+        self.setup_clients()
+        self.setup_caches(CACHE_NAME)
+        self.url = reverse("spot-list", format="geojson")
+
+        self.spot = baker.make(Spot, _quantity=2)[0]
+        baker.make(Document, spot=self.spot, _quantity=2)
+
+    def get_features(self, url, **extra):
+        response = self.read_client.get(url, **extra)
+        self.assertEqual(200, response.status_code)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        return json.loads(content)['features']
+
+    def test_snapshot(self):
+        """
+        Test and assert that the snapshot is reused until the data version changes
+        """
+        features = self.get_features(self.url)
+        self.assertEqual(len(features), 2)
+        self.assertEqual(len(features[0]['properties']['documents']), 2)
+
+        # changes that do not bump the version are not visible in the snapshot
+        baker.make(Spot)
+        self.assertEqual(len(self.get_features(self.url)), 2)
+
+        DataVersion.bump()
+        self.assertEqual(len(self.get_features(self.url)), 3)
+
+    def test_snapshot_gzip(self):
+        response = self.read_client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('gzip', response['Content-Encoding'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))['features']), 2)
+
+    def test_snapshot_not_modified(self):
+        """
+        Test and assert that the ETag is the data version, and the snapshot is not sent again while it is current
+        """
+        response = self.read_client.get(self.url)
+        etag = response['ETag']
+        self.assertEqual(etag, f'"{DataVersion.get_version()}"')
+
+        with mock.patch('api.views.get_geojson_snapshot') as mocked_get_geojson_snapshot:
+            response = self.read_client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+        mocked_get_geojson_snapshot.assert_not_called()
+
+        DataVersion.bump()
+        response = self.read_client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+
+    def test_query_params_not_cached(self):
+        """
+        Test and assert that requests with query parameters are not served from the snapshot, but streamed
+        """
+        self.get_features(self.url)
+        baker.make(Spot)
+        self.assertEqual(len(self.get_features(f'{self.url}?detailed=1')), 3)
+
+    def test_edit_bumps_version(self):
+        version = DataVersion.get_version()
+
+        url = reverse("spot-detail", [self.spot.id])
+        response = self.write_client.patch(url, data={"actiehouders": "Someone"})
+
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(DataVersion.get_version(), version)
+
+    def test_version_missing(self):
+        """
+        Test and assert that the version is created again when the table was emptied
+        """
+        DataVersion.objects.all().delete()
+
+        version = DataVersion.get_version()
+        self.assertEqual(DataVersion.get_version(), version)
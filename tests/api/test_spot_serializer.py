@@ -1,11 +1,13 @@
 from unittest import TestCase, mock
 
-from django.contrib.gis.geos import Point
+from django.contrib.gis.geos import MultiPolygon, Point, Polygon
+from django.test import TestCase as DjangoTestCase
 from django.utils.translation import gettext_lazy as _
 from rest_framework.exceptions import ValidationError
 
 from api.serializers import SpotSerializer
-from datasets.blackspots.models import Spot
+from api.stadsdeel_resolver import StadsdeelResolver
+from datasets.blackspots.models import Spot, Stadsdeel
 
 
 class TestSpotSerializers(TestCase):
@@ -171,10 +173,33 @@ class TestSpotSerializers(TestCase):
             self.assertEqual(attrs['jaar_blackspotlijst'], None)
             self.assertEqual(attrs['jaar_ongeval_quickscan'], None)
 
-    @mock.patch("api.serializers.BagGeoSearchAPI.get_stadsdeel")
+    @mock.patch("api.serializers.StadsdeelResolver.get_stadsdeel")
     def test_determine_stadsdeel(self, mocked_get_stadsdeel):
         mocked_get_stadsdeel.return_value = 'test'
         result = self.serializer.determine_stadsdeel(Point(x=123, y=789))
 
         mocked_get_stadsdeel.assert_called_with(lat=789, lon=123)
         self.assertEqual(result, 'test')
+
+
+class TestSpotSerializerStadsdeel(DjangoTestCase):
+
+    def setUp(self):
+        StadsdeelResolver.reset()
+        self.addCleanup(StadsdeelResolver.reset)
+        Stadsdeel.objects.create(
+            code=Spot.Stadsdelen.Centrum,
+            naam='Centrum',
+            geometrie=MultiPolygon(Polygon.from_bbox((4.88, 52.36, 4.91, 52.38)), srid=4326),
+        )
+
+    @mock.patch("api.stadsdeel_resolver.BagGeoSearchAPI.get_stadsdeel")
+    def test_validate_point_stadsdeel_local(self, mocked_get_stadsdeel):
+        """
+        Test and assert that the stadsdeel of a point is resolved from the boundaries without calling BAG
+        """
+        attrs = {'point': Point(4.895168, 52.370216)}
+        SpotSerializer().validate_point_stadsdeel(attrs)
+
+        self.assertEqual(attrs['stadsdeel'], Spot.Stadsdelen.Centrum)
+        mocked_get_stadsdeel.assert_not_called()
@@ -0,0 +1,94 @@
+import json
+import os
+import tempfile
+from unittest.mock import patch
+
+from django.contrib.gis.geos import MultiPolygon, Polygon
+from django.core.management import call_command
+from django.test import TestCase
+
+from api.stadsdeel_resolver import StadsdeelResolver
+from datasets.blackspots.models import Spot, Stadsdeel
+
+
+class TestStadsdeelResolver(TestCase):
+
+    def setUp(self):
+        StadsdeelResolver.reset()
+        self.addCleanup(StadsdeelResolver.reset)
+        Stadsdeel.objects.create(
+            code=Spot.Stadsdelen.Centrum,
+            naam='Centrum',
+            geometrie=MultiPolygon(Polygon.from_bbox((4.88, 52.36, 4.91, 52.38)), srid=4326),
+        )
+        Stadsdeel.objects.create(
+            code=Spot.Stadsdelen.Noord,
+            naam='Noord',
+            geometrie=MultiPolygon(Polygon.from_bbox((4.88, 52.38, 4.95, 52.42)), srid=4326),
+        )
+
+    @patch('api.stadsdeel_resolver.BagGeoSearchAPI.get_stadsdeel')
+    def test_get_stadsdeel_local(self, mocked_get_stadsdeel):
+        """
+        Test and assert that points inside a boundary are resolved without calling the BAG geosearch API
+        """
+        resolver = StadsdeelResolver()
+        self.assertEqual(resolver.get_stadsdeel(lat=52.370216, lon=4.895168), Spot.Stadsdelen.Centrum)
+        self.assertEqual(resolver.get_stadsdeel(lat=52.39, lon=4.92), Spot.Stadsdelen.Noord)
+        mocked_get_stadsdeel.assert_not_called()
+
+    @patch('api.stadsdeel_resolver.BagGeoSearchAPI.get_stadsdeel')
+    def test_get_stadsdeel_fallback(self, mocked_get_stadsdeel):
+        """
+        Test and assert that the BAG geosearch API is used for points outside all boundaries
+        """
+        mocked_get_stadsdeel.return_value = Spot.Stadsdelen.Geen
+
+        stadsdeel = StadsdeelResolver().get_stadsdeel(lat=52.0, lon=4.0)
+
+        self.assertEqual(stadsdeel, Spot.Stadsdelen.Geen)
+        mocked_get_stadsdeel.assert_called_with(lat=52.0, lon=4.0)
+
+    def test_boundaries_loaded_once(self):
+        """
+        Test and assert that the boundaries are only queried on the first lookup
+        """
+        resolver = StadsdeelResolver()
+        resolver.get_local_stadsdeel(lat=52.370216, lon=4.895168)
+        with self.assertNumQueries(0):
+            self.assertEqual(resolver.get_local_stadsdeel(lat=52.39, lon=4.92), Spot.Stadsdelen.Noord)
+
+
+class TestImportStadsdelen(TestCase):
+
+    def test_import_stadsdelen(self):
+        """
+        Test and assert that the boundaries are imported, and that unknown codes are skipped
+        """
+        feature_collection = {
+            'type': 'FeatureCollection',
+            'features': [
+                {
+                    'type': 'Feature',
+                    'properties': {'code': 'A', 'naam': 'Centrum'},
+                    'geometry': json.loads(Polygon.from_bbox((4.88, 52.36, 4.91, 52.38)).json),
+                },
+                {
+                    'type': 'Feature',
+                    'properties': {'code': 'Z'},
+                    'geometry': json.loads(Polygon.from_bbox((4.88, 52.36, 4.91, 52.38)).json),
+                },
+            ],
+        }
+        path = os.path.join(tempfile.mkdtemp(), 'stadsdelen.json')
+        with open(path, 'w') as file:
+            json.dump(feature_collection, file)
+
+        with self.assertLogs(level='ERROR'):
+            call_command('import_stadsdelen', path)
+
+        stadsdeel = Stadsdeel.objects.get()
+        self.assertEqual(stadsdeel.code, Spot.Stadsdelen.Centrum)
+        self.assertEqual(stadsdeel.naam, 'Centrum')
+        self.assertEqual(stadsdeel.geometrie.srid, 4326)
+        self.assertEqual(stadsdeel.geometrie.extent, (4.88, 52.36, 4.91, 52.38))
@@ -0,0 +1,130 @@
+from unittest import TestCase as SimpleTestCase
+from unittest import mock
+
+from django.contrib.gis.geos import LineString, Point
+from django.test import TestCase
+from model_bakery import baker
+from rest_framework.reverse import reverse
+
+from api.snapshots import TILES_CACHE_NAME, get_snapshot
+from api.tiles import get_tile_bounds, is_valid_tile
+from datasets.blackspots.models import DataVersion, Spot
+from tests.api.authzsetup import AuthorizationSetup
+from tests.api.cachesetup import CacheSetup
+
+# tile containing the centre of Amsterdam
+TILE = {'z': 12, 'x': 2103, 'y': 1346}
+
+
+class TestTileBounds(SimpleTestCase):
+
+    def test_get_tile_bounds(self):
+        xmin, ymin, xmax, ymax = get_tile_bounds(0, 0, 0)
+        self.assertAlmostEqual(xmin, -20037508.342789244)
+        self.assertAlmostEqual(ymin, -20037508.342789244)
+        self.assertAlmostEqual(xmax, 20037508.342789244)
+        self.assertAlmostEqual(ymax, 20037508.342789244)
+
+        xmin, ymin, xmax, ymax = get_tile_bounds(1, 1, 0)
+        self.assertAlmostEqual(xmin, 0)
+        self.assertAlmostEqual(ymin, 0)
+
+    def test_is_valid_tile(self):
+        self.assertTrue(is_valid_tile(**TILE))
+        self.assertFalse(is_valid_tile(1, 2, 0))
+        self.assertFalse(is_valid_tile(30, 0, 0))
+
+
+class TestTiles(TestCase, AuthorizationSetup, CacheSetup):
+    """
+    Verifies vector tiles of the spots are served per data version
+    """
+
+    def setUp(self):
+        self.setup_clients()
+        self.setup_caches(TILES_CACHE_NAME)
+        self.url = reverse('spot-tiles', kwargs={**TILE, 'format': 'pbf'})
+
+        baker.make(
+            Spot,
+            point=Point(4.9, 52.37),
+            wegvak=LineString((4.9, 52.37), (4.91, 52.38)),
+            stadsdeel=Spot.Stadsdelen.Centrum,
+            spot_type=Spot.SpotType.wegvak,
+        )
+
+    def test_tile(self):
+        response = self.read_client.get(self.url)
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual('application/vnd.mapbox-vector-tile', response['Content-Type'])
+        self.assertIn(b'spots', response.content)
+        self.assertIn(b'wegvakken', response.content)
+
+    def test_tile_empty(self):
+        url = reverse('spot-tiles', kwargs={'z': 12, 'x': 0, 'y': 0, 'format': 'pbf'})
+
+        response = self.read_client.get(url)
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(b'', response.content)
+
+    def test_tile_filtered(self):
+        """
+        Test and assert that the filters of the spot list are applied to the tiles
+        """
+        response = self.read_client.get(self.url, {'stadsdeel': Spot.Stadsdelen.Centrum})
+        self.assertNotEqual(b'', response.content)
+
+        response = self.read_client.get(self.url, {'stadsdeel': Spot.Stadsdelen.Noord})
+        self.assertEqual(b'', response.content)
+
+    def test_tile_cached(self):
+        """
+        Test and assert that a tile is built once per data version
+        """
+        url = reverse('spot-tiles', kwargs={'z': 12, 'x': 2104, 'y': 1346, 'format': 'pbf'})
+        self.assertEqual(b'', self.read_client.get(url).content)
+
+        baker.make(Spot, point=Point(5.0, 52.37))
+        self.assertEqual(b'', self.read_client.get(url).content)
+
+        DataVersion.bump()
+        self.assertNotEqual(b'', self.read_client.get(url).content)
+
+    @mock.patch('api.views.get_snapshot', wraps=get_snapshot)
+    def test_tile_cache_key(self, mocked_get_snapshot):
+        """
+        Test and assert that tiles are cached in their own cache, keyed on the filters only
+        """
+        self.read_client.get(self.url, {'status': Spot.StatusChoice.onbekend, 'stadsdeel': Spot.Stadsdelen.Centrum,
+                                        'unknown': 'value'})
+
+        name, _ = mocked_get_snapshot.call_args.args
+        filters = f"stadsdeel={Spot.Stadsdelen.Centrum}&status={Spot.StatusChoice.onbekend}"
+        self.assertEqual(name, f"tile:12/2103/1346:{filters}")
+        self.assertEqual(mocked_get_snapshot.call_args.kwargs,
+                         {'cache_name': TILES_CACHE_NAME, 'version': DataVersion.get_version()})
+
+    def test_tile_not_modified(self):
+        """
+        Test and assert that the client's copy of a tile is validated without reading the tile cache
+        """
+        etag = self.read_client.get(self.url)['ETag']
+
+        with mock.patch('api.views.get_snapshot') as mocked_get_snapshot:
+            response = self.read_client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(etag, response['ETag'])
+        mocked_get_snapshot.assert_not_called()
+
+    def test_tile_does_not_exist(self):
+        url = reverse('spot-tiles', kwargs={'z': 1, 'x': 2, 'y': 0, 'format': 'pbf'})
+        response = self.read_client.get(url)
+        self.assertEqual(404, response.status_code)
+
+    def test_tile_auth_error(self):
+        for client in [self.anon_client, self.write_client]:
+            response = client.get(self.url)
+            self.assertEqual(401, response.status_code)
@@ -0,0 +1,58 @@
+from unittest.mock import patch
+
+from django.contrib.gis.geos import MultiPolygon, Point, Polygon
+from django.core.management import call_command
+from django.test import TestCase
+from model_bakery import baker
+
+from api.stadsdeel_resolver import StadsdeelResolver
+from datasets.blackspots.models import Spot, Stadsdeel
+
+
+class TestUpdateFaultyStadsdelen(TestCase):
+
+    def setUp(self):
+        StadsdeelResolver.reset()
+        self.addCleanup(StadsdeelResolver.reset)
+        Stadsdeel.objects.create(
+            code=Spot.Stadsdelen.Centrum,
+            naam='Centrum',
+            geometrie=MultiPolygon(Polygon.from_bbox((4.88, 52.36, 4.91, 52.38)), srid=4326),
+        )
+        self.local_spot = baker.make(Spot, stadsdeel=Spot.Stadsdelen.BagFout, point=Point(4.89, 52.37))
+        self.remote_spot = baker.make(Spot, stadsdeel=Spot.Stadsdelen.BagFout, point=Point(4.95, 52.30))
+        self.failing_spot = baker.make(Spot, stadsdeel=Spot.Stadsdelen.BagFout, point=Point(4.80, 52.35))
+        self.correct_spot = baker.make(Spot, stadsdeel=Spot.Stadsdelen.Oost, point=Point(4.89, 52.37))
+
+    @patch('api.management.commands.update_faulty_stadsdelen.BagGeoSearchAPI.get_stadsdeel')
+    def test_update_faulty_stadsdelen(self, mocked_get_stadsdeel):
+        """
+        Test and assert that the faulty stadsdelen are resolved, locally if possible, and updated
+        """
+        mocked_get_stadsdeel.side_effect = lambda lat, lon: {
+            4.95: Spot.Stadsdelen.Zuidoost,
+            4.80: Spot.Stadsdelen.BagFout,
+        }[lon]
+
+        call_command('update_faulty_stadsdelen', workers=2)
+
+        self.assertEqual(mocked_get_stadsdeel.call_count, 2)
+        for spot, stadsdeel in [
+            (self.local_spot, Spot.Stadsdelen.Centrum),
+            (self.remote_spot, Spot.Stadsdelen.Zuidoost),
+            (self.failing_spot, Spot.Stadsdelen.BagFout),
+            (self.correct_spot, Spot.Stadsdelen.Oost),
+        ]:
+            spot.refresh_from_db()
+            self.assertEqual(spot.stadsdeel, stadsdeel)
+
+    @patch('api.management.commands.update_faulty_stadsdelen.BagGeoSearchAPI.get_stadsdeel')
+    def test_update_faulty_stadsdelen_nothing_updated(self, mocked_get_stadsdeel):
+        mocked_get_stadsdeel.return_value = Spot.Stadsdelen.BagFout
+        Spot.objects.filter(id=self.local_spot.id).delete()
+
+        with self.assertLogs(level='INFO') as logs:
+            call_command('update_faulty_stadsdelen')
+
+        self.assertIn('INFO:api.management.commands.update_faulty_stadsdelen:'
+                      'No Spots updated; all have correct stadsdeel', logs.output)
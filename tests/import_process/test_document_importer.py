@@ -5,6 +5,7 @@ from model_bakery import baker
 
 from datasets.blackspots.models import Document, Spot
 from import_process.process_xls import InputError, create_document
+from storage.objectstore import DocumentIndex
 
 
 class TestDocumentImporter(TestCase):
@@ -14,9 +15,9 @@ class TestDocumentImporter(TestCase):
 
     def test_correct_reference(self):
         filename = 'foo_bar with spaces.pdf'
-        available_documents = [
+        available_documents = DocumentIndex([
             ('rapportage', filename,),
-        ]
+        ])
 
         create_document(available_documents, Document.DocumentType.Rapportage, filename, self.spot)
 
@@ -28,9 +29,9 @@ class TestDocumentImporter(TestCase):
     @skip  # TODO activate when import is throwing exception
     def test_unavailable_reference(self):
         filename = 'foo_bar with spaces.pdf'
-        available_documents = [
+        available_documents = DocumentIndex([
             ('rapportage', filename,),
-        ]
+        ])
 
         self.assertRaises(
             InputError,
@@ -43,3 +44,19 @@ class TestDocumentImporter(TestCase):
         )
 
         self.assertEqual(Document.objects.count(), 0)
+
+    def test_wrong_folder_reference(self):
+        filename = 'foo_bar with spaces.pdf'
+        available_documents = DocumentIndex([
+            ('ontwerp', filename,),
+        ])
+
+        with self.assertLogs(level='ERROR') as logs:
+            create_document(available_documents, Document.DocumentType.Rapportage, filename, self.spot)
+
+        self.assertEqual(Document.objects.count(), 0)
+        self.assertIn(
+            'ERROR:import_process.process_xls:File on object store is in the wrong folder: '
+            'foo_bar with spaces.pdf of type Rapportage found in ontwerp',
+            logs.output
+        )
@@ -0,0 +1,121 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from datasets.blackspots.models import DataVersion, ImportState, Spot
+from import_process.management.commands.import_spots import perform_import
+from import_process.process_xls import InputError
+from storage.objectstore import get_documents_fingerprint
+from tests.import_process.test_process_xls import make_row
+from tests.import_process.test_sync import collect
+
+
+class TestPerformImport(TestCase):
+
+    def setUp(self):
+        self.spot = Spot.objects.create(**make_row('B1')[0])
+
+        patcher = mock.patch('import_process.management.commands.import_spots.ObjectStore')
+        self.objstore = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+        self.objstore.get_spots_etag.return_value = 'etag'
+        self.objstore.get_wba_documents_list.return_value = [('rapportage', 'B1_rapportage.pdf')]
+        self.documents_hash = get_documents_fingerprint([('rapportage', 'B1_rapportage.pdf')])
+
+    @mock.patch('import_process.management.commands.import_spots.collect_spots')
+    def test_perform_import(self, mocked_collect_spots):
+        """
+        Test and assert that a full import replaces all spots
+        """
+        mocked_collect_spots.return_value = collect(make_row('B2'), make_row('B3'))
+        version = DataVersion.get_version()
+
+        perform_import()
+
+        self.assertEqual(set(Spot.objects.values_list('locatie_id', flat=True)), {'B2', 'B3'})
+        self.objstore.fetch_spots.assert_called_with(mock.ANY, etag='etag')
+        import_state = ImportState.objects.get()
+        self.assertEqual(import_state.xls_etag, 'etag')
+        self.assertEqual(import_state.documents_hash, self.documents_hash)
+        self.assertNotEqual(DataVersion.get_version(), version)
+
+    @mock.patch('import_process.management.commands.import_spots.collect_spots')
+    def test_perform_import_incremental(self, mocked_collect_spots):
+        """
+        Test and assert that an incremental import keeps the id of existing spots
+        """
+        mocked_collect_spots.return_value = collect(make_row('B1'), make_row('B2'))
+
+        perform_import(incremental=True)
+
+        self.assertEqual(set(Spot.objects.values_list('locatie_id', flat=True)), {'B1', 'B2'})
+        self.assertEqual(Spot.objects.get(locatie_id='B1').id, self.spot.id)
+
+    @mock.patch('import_process.management.commands.import_spots.collect_spots')
+    def test_perform_import_parse_error(self, mocked_collect_spots):
+        """
+        Test and assert that the current spots are kept when the xls file can not be parsed
+        """
+        mocked_collect_spots.side_effect = InputError('Unknown stadsdeel: Q')
+
+        with self.assertRaises(InputError):
+            perform_import()
+
+        self.assertEqual(list(Spot.objects.values_list('locatie_id', flat=True)), ['B1'])
+
+    @mock.patch('import_process.management.commands.import_spots.create_spots')
+    @mock.patch('import_process.management.commands.import_spots.collect_spots')
+    def test_perform_import_write_error(self, mocked_collect_spots, mocked_create_spots):
+        """
+        Test and assert that clearing the current spots is rolled back when writing the new spots fails
+        """
+        mocked_collect_spots.return_value = collect(make_row('B2'))
+        mocked_create_spots.side_effect = ValueError()
+
+        with self.assertRaises(ValueError):
+            perform_import()
+
+        self.assertEqual(list(Spot.objects.values_list('locatie_id', flat=True)), ['B1'])
+
+    @mock.patch('import_process.management.commands.import_spots.collect_spots')
+    def test_perform_import_unchanged(self, mocked_collect_spots):
+        """
+        Test and assert that the import is skipped when nothing changed since the last import
+        """
+        ImportState.objects.create(xls_etag='etag', documents_hash=self.documents_hash)
+
+        with self.assertLogs(level='INFO') as logs:
+            perform_import()
+
+        self.objstore.fetch_spots.assert_not_called()
+        mocked_collect_spots.assert_not_called()
+        self.assertEqual(ImportState.objects.count(), 1)
+        self.assertIn('INFO:import_process.management.commands.import_spots:Xls file and documents list '
+                      'did not change since the last import, skipping import', logs.output)
+
+    @mock.patch('import_process.management.commands.import_spots.collect_spots')
+    def test_perform_import_unchanged_force(self, mocked_collect_spots):
+        """
+        Test and assert that the import is not skipped when it is forced
+        """
+        ImportState.objects.create(xls_etag='etag', documents_hash=self.documents_hash)
+        mocked_collect_spots.return_value = collect(make_row('B2'))
+
+        perform_import(force=True)
+
+        self.assertEqual(list(Spot.objects.values_list('locatie_id', flat=True)), ['B2'])
+
+    @mock.patch('import_process.management.commands.import_spots.collect_spots')
+    def test_perform_import_documents_changed(self, mocked_collect_spots):
+        """
+        Test and assert that only the documents are updated when the xls file did not change
+        """
+        ImportState.objects.create(xls_etag='etag', documents_hash='old hash')
+        mocked_collect_spots.return_value = collect(make_row('B1', rapportage='B1_rapportage.pdf'))
+
+        perform_import()
+
+        self.objstore.fetch_spots.assert_called_with(mock.ANY, etag='etag')
+        self.assertEqual(Spot.objects.get().id, self.spot.id)
+        self.assertEqual(self.spot.documents.get().filename, 'B1_rapportage.pdf')
+        self.assertEqual(ImportState.objects.count(), 2)
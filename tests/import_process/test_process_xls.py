@@ -0,0 +1,149 @@
+import datetime
+from unittest import mock
+
+from django.contrib.gis.geos import Point
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from datasets.blackspots.models import Document, Spot
+from import_process.process_xls import EXCEL_STRUCTURE, collect_spots, create_spots, read_spots
+from storage.objectstore import DocumentIndex
+from tests.import_process.test_reader import create_xlsx
+
+
+def make_row(locatie_id, rapportage='', ontwerp=''):
+    spot_data = {
+        "locatie_id": locatie_id,
+        "actiehouders": "Someone",
+        "spot_type": Spot.SpotType.blackspot,
+        "description": f"Description {locatie_id}",
+        "point": Point(4.9, 52.3),
+        "wegvak": None,
+        "stadsdeel": Spot.Stadsdelen.Centrum,
+        "status": Spot.StatusChoice.gereed,
+        "start_uitvoering": "01/01/19",
+        "eind_uitvoering": "",
+        "tasks": "",
+        "notes": "",
+        "jaar_blackspotlijst": 2019,
+        "jaar_ongeval_quickscan": None,
+        "jaar_oplevering": None,
+    }
+    document_filenames = [
+        (Document.DocumentType.Rapportage, rapportage),
+        (Document.DocumentType.Ontwerp, ontwerp),
+    ]
+    return spot_data, document_filenames
+
+
+class TestCreateSpots(TestCase):
+
+    document_list = DocumentIndex([
+        ('rapportage', 'B1_rapportage.pdf'),
+        ('ontwerp', 'B1_ontwerp.pdf'),
+        ('rapportage', 'B2_rapportage.pdf'),
+    ])
+
+    @mock.patch('import_process.process_xls.read_spots')
+    def test_create_spots(self, mocked_read_spots):
+        """
+        Test and assert that all spots and their available documents are created
+        """
+        mocked_read_spots.return_value = [
+            make_row('B1', rapportage='B1_rapportage.pdf', ontwerp='B1_ontwerp.pdf'),
+            make_row('B2', rapportage='B2_rapportage.pdf', ontwerp='missing.pdf'),
+            make_row('B3'),
+        ]
+
+        create_spots(*collect_spots('path.xls', self.document_list))
+
+        self.assertEqual(Spot.objects.count(), 3)
+        self.assertEqual(Document.objects.count(), 3)
+        spot = Spot.objects.get(locatie_id='B1')
+        self.assertEqual(
+            set(spot.documents.values_list('type', 'filename')),
+            {
+                (Document.DocumentType.Rapportage, 'B1_rapportage.pdf'),
+                (Document.DocumentType.Ontwerp, 'B1_ontwerp.pdf'),
+            }
+        )
+
+    @mock.patch('import_process.process_xls.read_spots')
+    def test_create_spots_duplicate_locatie_id(self, mocked_read_spots):
+        """
+        Test and assert that a duplicate locatie_id is skipped instead of failing the import
+        """
+        mocked_read_spots.return_value = [
+            make_row('B1'),
+            make_row('B1', rapportage='B1_rapportage.pdf'),
+        ]
+
+        with self.assertLogs(level='ERROR') as logs:
+            create_spots(*collect_spots('path.xls', self.document_list))
+
+        self.assertEqual(Spot.objects.count(), 1)
+        self.assertEqual(Document.objects.count(), 0)
+        self.assertIn('ERROR:import_process.process_xls:Duplicate locatie_id: B1, skipping', logs.output)
+
+    @mock.patch('import_process.process_xls.read_spots')
+    def test_create_spots_query_count(self, mocked_read_spots):
+        """
+        Test and assert that the number of queries does not depend on the number of rows
+        """
+        query_counts = []
+        for row_count in [5, 50]:
+            Spot.objects.all().delete()
+            mocked_read_spots.return_value = [
+                make_row(f'B{idx}', rapportage='B1_rapportage.pdf') for idx in range(row_count)
+            ]
+            with CaptureQueriesContext(connection) as context:
+                create_spots(*collect_spots('path.xls', self.document_list))
+            query_counts.append(len(context.captured_queries))
+
+            self.assertEqual(Spot.objects.count(), row_count)
+            self.assertEqual(Document.objects.count(), row_count)
+
+        self.assertEqual(query_counts[0], query_counts[1])
+
+
+class TestReadSpots(TestCase):
+
+    def test_read_spots_xlsx(self):
+        """
+        Test and assert that the spot data and document filenames are read from an xlsx file
+        """
+        headers = [value['header'] for value in EXCEL_STRUCTURE.values()]
+        path = create_xlsx([
+            headers,
+            [
+                'B1', 'Some street', 'B', 52.3, 4.9, '[[4.9, 52.3], [4.8, 52.4]]', 'A', 'Gereed', 'Someone',
+                'Tasks', datetime.datetime(2019, 1, 2), 'Onbekend', 2019, '', 2020, 'Notes',
+                'B1_rapportage.pdf', '',
+            ],
+            [
+                'Q1', 'Skipped', 'QSNP', 52.3, 4.9, '', 'A', 'Gereed', 'Someone',
+                '', '', '', '', '', '', '', '', '',
+            ],
+        ])
+
+        with self.assertLogs(level='ERROR'):
+            rows = list(read_spots(path))
+
+        self.assertEqual(len(rows), 1)
+        spot_data, document_filenames = rows[0]
+        self.assertEqual(spot_data['locatie_id'], 'B1')
+        self.assertEqual(spot_data['spot_type'], Spot.SpotType.blackspot)
+        self.assertEqual(spot_data['point'], Point(4.9, 52.3))
+        self.assertEqual(spot_data['wegvak'].coords, ((4.9, 52.3), (4.8, 52.4)))
+        self.assertEqual(spot_data['stadsdeel'], Spot.Stadsdelen.Centrum)
+        self.assertEqual(spot_data['status'], Spot.StatusChoice.gereed)
+        self.assertEqual(spot_data['start_uitvoering'], '02/01/19')
+        self.assertEqual(spot_data['eind_uitvoering'], 'Onbekend')
+        self.assertEqual(spot_data['jaar_blackspotlijst'], 2019)
+        self.assertIsNone(spot_data['jaar_ongeval_quickscan'])
+        self.assertEqual(spot_data['jaar_oplevering'], 2020)
+        self.assertEqual(document_filenames, [
+            (Document.DocumentType.Rapportage, 'B1_rapportage.pdf'),
+            (Document.DocumentType.Ontwerp, ''),
+        ])
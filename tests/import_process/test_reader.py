@@ -0,0 +1,99 @@
+import datetime
+import os
+import tempfile
+from unittest import TestCase, mock
+
+from openpyxl import Workbook
+
+from import_process.reader import SheetReader, XlsReader, XlsxReader, open_sheet
+
+
+def create_xlsx(rows):
+    """
+    Write the rows to a temporary xlsx file, and return its path
+    """
+    workbook = Workbook()
+    sheet = workbook.active
+    for row in rows:
+        sheet.append(row)
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'spots.xlsx')
+    workbook.save(path)
+    return path
+
+
+class TestXlsxReader(TestCase):
+
+    def setUp(self):
+        self.path = create_xlsx([
+            ['Nummer', 'Omschrijving', 'Datum'],
+            ['B1', None, datetime.datetime(2019, 1, 2)],
+            ['B2', 'Some street'],
+        ])
+
+    def test_open_sheet(self):
+        with open_sheet(self.path) as sheet:
+            self.assertIsInstance(sheet, XlsxReader)
+
+    def test_read_headers(self):
+        with open_sheet(self.path) as sheet:
+            self.assertEqual(sheet.read_headers(), ['Nummer', 'Omschrijving', 'Datum'])
+
+    def test_rows(self):
+        """
+        Test and assert that only the requested columns are returned, with empty cells as ''
+        """
+        structure = {
+            'number': {'column_idx': 0},
+            'date': {'column_idx': 2},
+        }
+        with open_sheet(self.path) as sheet:
+            rows = list(sheet.rows(structure))
+
+        self.assertEqual(rows, [
+            {'number': 'B1', 'date': datetime.datetime(2019, 1, 2)},
+            {'number': 'B2', 'date': ''},
+        ])
+
+
+class TestXlsReader(TestCase):
+
+    @mock.patch('import_process.reader.xlrd.open_workbook')
+    def test_rows(self, mocked_open_workbook):
+        """
+        Test and assert that whole columns are read from the first sheet
+        """
+        book = mocked_open_workbook.return_value
+        book.datemode = 1
+        sheet = book.sheet_by_index.return_value
+        sheet.col_values.side_effect = lambda column_idx, start_rowx: {
+            0: ['B1', 'B2'],
+            2: [43467.0, ''],
+        }[column_idx]
+
+        with open_sheet('spots.xls') as reader:
+            self.assertIsInstance(reader, XlsReader)
+            self.assertEqual(reader.datemode, 1)
+            rows = list(reader.rows({'number': {'column_idx': 0}, 'date': {'column_idx': 2}}))
+
+        mocked_open_workbook.assert_called_with('spots.xls', on_demand=True)
+        book.sheet_by_index.assert_called_with(0)
+        book.release_resources.assert_called()
+        self.assertEqual(rows, [
+            {'number': 'B1', 'date': 43467.0},
+            {'number': 'B2', 'date': ''},
+        ])
+
+
+class TestSheetReader(TestCase):
+
+    def test_incomplete_reader(self):
+        """
+        Test and assert that a reader without read_columns can not be created
+        """
+        class HeaderReader(SheetReader):
+            def read_headers(self):
+                return []
+
+        with self.assertRaises(TypeError):
+            HeaderReader()
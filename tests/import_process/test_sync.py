@@ -0,0 +1,85 @@
+from unittest import mock
+
+from django.test import TestCase
+from model_bakery import baker
+
+from datasets.blackspots.models import Document, Spot
+from import_process.sync import sync_models
+from tests.import_process.test_process_xls import make_row
+
+
+def collect(*rows):
+    """
+    Mimic import_process.process_xls.collect_spots for the given rows
+    """
+    spots = {}
+    documents = []
+    for spot_data, document_filenames in rows:
+        spot = Spot(**spot_data)
+        spots[spot.locatie_id] = spot
+        for doc_type, filename in document_filenames:
+            if filename:
+                documents.append(Document(type=doc_type, filename=filename, spot=spot))
+    return spots, documents
+
+
+class TestSyncModels(TestCase):
+
+    def setUp(self):
+        self.unchanged_spot = Spot.objects.create(**make_row('B1')[0])
+        self.changed_spot = Spot.objects.create(**make_row('B2')[0])
+        self.removed_spot = Spot.objects.create(**make_row('B3')[0])
+        self.kept_document = baker.make(
+            Document, spot=self.unchanged_spot, type=Document.DocumentType.Rapportage, filename='B1_rapportage.pdf')
+        self.removed_document = baker.make(
+            Document, spot=self.unchanged_spot, type=Document.DocumentType.Ontwerp, filename='B1_ontwerp.pdf')
+
+    def test_sync_spots(self):
+        """
+        Test and assert that new spots are created, changed spots are updated in place
+        and spots missing from the xls are deleted
+        """
+        changed_row = make_row('B2')
+        changed_row[0]['status'] = Spot.StatusChoice.uitvoering
+        new_spots, new_documents = collect(make_row('B1'), changed_row, make_row('B4'))
+
+        sync_models(new_spots, new_documents)
+
+        self.assertEqual(
+            set(Spot.objects.values_list('locatie_id', flat=True)),
+            {'B1', 'B2', 'B4'}
+        )
+        self.assertEqual(Spot.objects.get(locatie_id='B1').id, self.unchanged_spot.id)
+        changed_spot = Spot.objects.get(locatie_id='B2')
+        self.assertEqual(changed_spot.id, self.changed_spot.id)
+        self.assertEqual(changed_spot.status, Spot.StatusChoice.uitvoering)
+
+    def test_sync_spots_unchanged(self):
+        """
+        Test and assert that no spots are written when nothing changed
+        """
+        new_spots, new_documents = collect(make_row('B1'), make_row('B2'), make_row('B3'))
+
+        with mock.patch('import_process.sync.Spot.objects.bulk_update') as mocked_bulk_update:
+            sync_models(new_spots, new_documents)
+
+        mocked_bulk_update.assert_not_called()
+        self.assertEqual(Spot.objects.count(), 3)
+
+    def test_sync_documents(self):
+        """
+        Test and assert that existing documents are kept, new documents are created
+        and documents missing from the xls are deleted
+        """
+        new_spots, new_documents = collect(
+            make_row('B1', rapportage='B1_rapportage.pdf'),
+            make_row('B4', ontwerp='B4_ontwerp.pdf'),
+        )
+
+        sync_models(new_spots, new_documents)
+
+        self.assertTrue(Document.objects.filter(id=self.kept_document.id).exists())
+        self.assertFalse(Document.objects.filter(id=self.removed_document.id).exists())
+        new_document = Document.objects.get(filename='B4_ontwerp.pdf')
+        self.assertEqual(new_document.spot.locatie_id, 'B4')
+        self.assertEqual(Document.objects.count(), 2)
@@ -1,26 +1,95 @@
+import json
+import os
+import tempfile
+import threading
 from unittest import TestCase, mock
-from unittest.mock import Mock, mock_open
+from unittest.mock import Mock
 
 from django.test import override_settings
 from swiftclient import ClientException, Connection
 
 from datasets.blackspots.models import Document
-from storage.objectstore import DOWNLOAD_DIR, WBA_CONTAINER_NAME, XLS_OBJECT_NAME, ObjectStore
+from storage.objectstore import (DOWNLOAD_CHUNK_SIZE, WBA_CONTAINER_NAME, XLS_OBJECT_NAME, DocumentCache, DocumentIndex,
+                                 ObjectStore, get_documents_fingerprint)
 
 
 class ObjectStoreTestCase(TestCase):
 
+    def setUp(self):
+        ObjectStore.reset_connections()
+        self.addCleanup(ObjectStore.reset_connections)
+
     @mock.patch("storage.objectstore.objectstore.get_connection")
     def test_get_connection(self, mocked_get_connection):
         """
         Test and assert that objecstore.get_connection is called with the given
         config, and that the connection is returned.
         """
-        mocked_get_connection.return_value = 'this is the connection'
+        mocked_get_connection.return_value = Mock()
         objstore = ObjectStore(config='this is the config')
         connection = objstore.get_connection()
         mocked_get_connection.assert_called_with('this is the config')
-        self.assertEqual(connection, 'this is the connection')
+        self.assertIs(connection, mocked_get_connection.return_value)
+
+    @mock.patch("storage.objectstore.objectstore.get_connection")
+    def test_get_connection_reused(self, mocked_get_connection):
+        """
+        Test and assert that a thread reuses its connection, also for new ObjectStore instances
+        """
+        mocked_get_connection.side_effect = lambda config: Mock()
+        connection = ObjectStore(config='this is the config').get_connection()
+
+        self.assertIs(ObjectStore(config='this is the config').get_connection(), connection)
+        self.assertIsNot(ObjectStore(config='other config').get_connection(), connection)
+        self.assertEqual(mocked_get_connection.call_count, 2)
+
+    @mock.patch("storage.objectstore.objectstore.get_connection")
+    def test_get_connection_shared_token(self, mocked_get_connection):
+        """
+        Test and assert that each thread gets its own connection, but that
+        the auth token is shared between them
+        """
+        authenticate = Mock(return_value=('https://objectstore/v1', 'token'))
+
+        def create_connection(config):
+            connection = Mock()
+            connection.get_auth = authenticate
+            return connection
+
+        mocked_get_connection.side_effect = create_connection
+        objstore = ObjectStore(config='this is the config')
+        connection = objstore.get_connection()
+
+        other_connections = []
+        thread = threading.Thread(target=lambda: other_connections.append(objstore.get_connection()))
+        thread.start()
+        thread.join()
+
+        self.assertIsNot(other_connections[0], connection)
+        self.assertEqual(connection.get_auth(), ('https://objectstore/v1', 'token'))
+        self.assertEqual(other_connections[0].get_auth(), ('https://objectstore/v1', 'token'))
+        authenticate.assert_called_once()
+
+    @mock.patch("storage.objectstore.objectstore.get_connection")
+    def test_get_connection_reauthenticate(self, mocked_get_connection):
+        """
+        Test and assert that a new token is requested when the object store rejects the token
+        """
+        connection = Connection('https://identity/v2.0', 'user', 'key', retries=1, starting_backoff=0)
+        authenticate = Mock(side_effect=[('https://objectstore/v1', 'expired'),
+                                         ('https://objectstore/v1', 'token')])
+        connection.get_auth = authenticate
+        mocked_get_connection.return_value = connection
+
+        def head_account(url, token, **kwargs):
+            if token == 'expired':
+                raise ClientException('Unauthorized', http_status=401)
+            return {'token': token}
+
+        pooled_connection = ObjectStore(config='this is the config').get_connection()
+        self.assertEqual(pooled_connection._retry(None, head_account), {'token': 'token'})
+        self.assertEqual(pooled_connection._retry(None, head_account), {'token': 'token'})
+        self.assertEqual(authenticate.call_count, 2)
 
     @mock.patch("storage.objectstore.objectstore.get_connection")
     @mock.patch("storage.objectstore.ObjectStore.get_container_path")
@@ -87,7 +156,31 @@ class ObjectStoreTestCase(TestCase):
 
         objstore = ObjectStore(config='this is the config')
         objstore.get_document(connection, container_name, object_name)
-        connection.get_object.assert_called_with(container_name, object_name)
+        connection.get_object.assert_called_with(container_name, object_name, resp_chunk_size=None, headers=None)
+
+    def test_get_document_chunked(self):
+        """
+        Test and assert that the chunk size is passed on, so the contents are streamed
+        """
+        connection = Mock()
+
+        objstore = ObjectStore(config='this is the config')
+        objstore.get_document(connection, 'container_name_mock', 'object_name_mock', chunk_size=1024)
+        connection.get_object.assert_called_with('container_name_mock', 'object_name_mock', resp_chunk_size=1024,
+                                                 headers=None)
+
+    def test_get_document_headers(self):
+        """
+        Test and assert that the headers are fetched with a HEAD request
+        """
+        connection = Mock()
+        connection.head_object.return_value = {'etag': 'abc'}
+
+        objstore = ObjectStore(config='this is the config')
+        headers = objstore.get_document_headers(connection, 'container_name_mock', 'object_name_mock')
+
+        connection.head_object.assert_called_with('container_name_mock', 'object_name_mock')
+        self.assertEqual(headers, {'etag': 'abc'})
 
     @mock.patch("storage.objectstore.get_full_container_list")
     def test_get_wba_documents_list(self, mocked_get_full_container_list):
@@ -112,49 +205,134 @@ class ObjectStoreTestCase(TestCase):
             ('ontwerp', 'filename3.pdf'),
         ])
 
-    @mock.patch("storage.objectstore.os.makedirs")
-    @mock.patch("storage.objectstore.os.path.isfile")
-    def test_get_file_cache(self, mocked_isfile, mocked_makedirs):
+    def test_get_file_download(self):
+        """
+        Test and assert that the object is streamed to disk, together with its metadata
+        """
         connection = Mock()
-        container_name = 'container_name_mock'
-        object_name = 'object_name_mock'
+        connection.get_object.return_value = [{'etag': 'abc', 'content-length': '11'}, iter([b'mocked', b'_data'])]
+        download_dir = tempfile.mkdtemp()
 
-        mocked_isfile.return_value = True
+        with mock.patch("storage.objectstore.DOWNLOAD_DIR", download_dir):
+            objstore = ObjectStore(config='this is the config')
+            with self.assertLogs(level='INFO') as logs:
+                return_value = objstore.get_file(connection, 'container_name_mock', 'object_name_mock', etag='abc')
 
-        objstore = ObjectStore(config='this is the config')
-        with self.assertLogs(level='INFO') as logs:
-            return_value = objstore.get_file(connection, container_name, object_name)
+        self.assertEqual(return_value, os.path.join(download_dir, 'object_name_mock'))
+        self.assertIn('INFO:storage.objectstore:Fetching file: object_name_mock', logs.output)
+        connection.get_object.assert_called_with('container_name_mock', 'object_name_mock',
+                                                 resp_chunk_size=DOWNLOAD_CHUNK_SIZE)
+        with open(return_value, 'rb') as file:
+            self.assertEqual(file.read(), b'mocked_data')
+        with open(f'{return_value}.json') as file:
+            metadata = json.load(file)
+        self.assertEqual(metadata['etag'], 'abc')
+        self.assertEqual(metadata['size'], 11)
+        self.assertIn('fetched_at', metadata)
+        self.assertEqual(sorted(os.listdir(download_dir)), ['object_name_mock', 'object_name_mock.json'])
+
+    def test_get_file_cache(self):
+        """
+        Test and assert that a previous download is used while the etag on the object store is the same
+        """
+        connection = Mock()
+        connection.get_object.return_value = [{'etag': 'abc'}, iter([b'mocked_data'])]
+        connection.head_object.return_value = {'etag': 'abc'}
+        download_dir = tempfile.mkdtemp()
+
+        with mock.patch("storage.objectstore.DOWNLOAD_DIR", download_dir):
+            objstore = ObjectStore(config='this is the config')
+            objstore.get_file(connection, 'container_name_mock', 'object_name_mock')
+            with self.assertLogs(level='INFO') as logs:
+                return_value = objstore.get_file(connection, 'container_name_mock', 'object_name_mock')
 
-        mocked_makedirs.assert_called_with(DOWNLOAD_DIR, exist_ok=True)
         self.assertIn('INFO:storage.objectstore:Using cached file: object_name_mock', logs.output)
-        self.assertEqual(return_value, f"{DOWNLOAD_DIR}{object_name}")
+        self.assertEqual(return_value, os.path.join(download_dir, 'object_name_mock'))
+        connection.head_object.assert_called_with('container_name_mock', 'object_name_mock')
+        self.assertEqual(connection.get_object.call_count, 1)
 
-    @mock.patch("storage.objectstore.os.makedirs")
-    @mock.patch("storage.objectstore.os.path.isfile")
-    @mock.patch("builtins.open", new_callable=mock_open)
-    def test_get_file_download(self, mocked_file, mocked_isfile, mocked_makedirs):
+    def test_get_file_changed(self):
+        """
+        Test and assert that the object is downloaded again when its etag changed
+        """
         connection = Mock()
-        connection.get_object.return_value = [None, 'mocked_data']
-        container_name = 'container_name_mock'
-        object_name = 'object_name_mock'
+        connection.get_object.side_effect = [
+            [{'etag': 'abc'}, iter([b'old_data'])],
+            [{'etag': 'def'}, iter([b'new_data'])],
+        ]
+        download_dir = tempfile.mkdtemp()
 
-        mocked_isfile.return_value = False
+        with mock.patch("storage.objectstore.DOWNLOAD_DIR", download_dir):
+            objstore = ObjectStore(config='this is the config')
+            objstore.get_file(connection, 'container_name_mock', 'object_name_mock', etag='abc')
+            return_value = objstore.get_file(connection, 'container_name_mock', 'object_name_mock', etag='def')
 
-        objstore = ObjectStore(config='this is the config')
-        with self.assertLogs(level='INFO') as logs:
-            return_value = objstore.get_file(connection, container_name, object_name)
+        with open(return_value, 'rb') as file:
+            self.assertEqual(file.read(), b'new_data')
 
-        mocked_makedirs.assert_called_with(DOWNLOAD_DIR, exist_ok=True)
-        self.assertNotIn('INFO:storage.objectstore:Using cached file: object_name_mock', logs.output)
-        connection.get_object.assert_called_with(container_name, object_name)
-        mocked_file().write.assert_called_with('mocked_data')
-        self.assertEqual(return_value, f"{DOWNLOAD_DIR}{object_name}")
+    def test_get_file_incomplete(self):
+        """
+        Test and assert that a truncated file is not used, and downloaded again
+        """
+        connection = Mock()
+        connection.get_object.side_effect = lambda *args, **kwargs: [{'etag': 'abc'}, iter([b'mocked_data'])]
+        download_dir = tempfile.mkdtemp()
+
+        with mock.patch("storage.objectstore.DOWNLOAD_DIR", download_dir):
+            objstore = ObjectStore(config='this is the config')
+            path = objstore.get_file(connection, 'container_name_mock', 'object_name_mock', etag='abc')
+            with open(path, 'wb') as file:
+                file.write(b'mocked')
+            objstore.get_file(connection, 'container_name_mock', 'object_name_mock', etag='abc')
+
+        self.assertEqual(connection.get_object.call_count, 2)
+        with open(path, 'rb') as file:
+            self.assertEqual(file.read(), b'mocked_data')
+
+    def test_get_file_interrupted(self):
+        """
+        Test and assert that an interrupted download leaves no file behind
+        """
+        def chunks():
+            yield b'mocked'
+            raise ClientException('Connection lost')
+
+        connection = Mock()
+        connection.get_object.return_value = [{'etag': 'abc'}, chunks()]
+        download_dir = tempfile.mkdtemp()
+
+        with mock.patch("storage.objectstore.DOWNLOAD_DIR", download_dir):
+            objstore = ObjectStore(config='this is the config')
+            with self.assertRaises(ClientException):
+                objstore.get_file(connection, 'container_name_mock', 'object_name_mock', etag='abc')
+
+        self.assertEqual(os.listdir(download_dir), [])
 
     @mock.patch("storage.objectstore.ObjectStore.get_file")
     def test_fetch_spots(self, mocked_get_file):
         objstore = ObjectStore(config='this is the config')
-        objstore.fetch_spots(connection='test connection')
-        mocked_get_file.assert_called_with('test connection', WBA_CONTAINER_NAME, XLS_OBJECT_NAME)
+        objstore.fetch_spots(connection='test connection', etag='abc')
+        mocked_get_file.assert_called_with('test connection', WBA_CONTAINER_NAME, XLS_OBJECT_NAME, etag='abc')
+
+    def test_get_spots_etag(self):
+        connection = Mock()
+        connection.head_object.return_value = {'etag': 'mocked_etag', 'content-length': '10'}
+
+        objstore = ObjectStore(config='this is the config')
+        self.assertEqual(objstore.get_spots_etag(connection), 'mocked_etag')
+        connection.head_object.assert_called_with(WBA_CONTAINER_NAME, XLS_OBJECT_NAME)
+
+    def test_get_documents_fingerprint(self):
+        """
+        Test and assert that the fingerprint only changes when the set of documents changes
+        """
+        documents = [('ontwerp', 'filename1.pdf'), ('rapportage', 'filename2.pdf')]
+        fingerprint = get_documents_fingerprint(documents)
+
+        self.assertEqual(fingerprint, get_documents_fingerprint(list(reversed(documents))))
+        self.assertNotEqual(fingerprint, get_documents_fingerprint(documents[:1]))
+        self.assertNotEqual(fingerprint, get_documents_fingerprint([('rapportage', 'filename1.pdf'),
+                                                                    ('rapportage', 'filename2.pdf')]))
 
     @override_settings(OBJECTSTORE_UPLOAD_CONTAINER_NAME="upload_container_name")
     def test_get_container_path_ontwerp(self):
@@ -171,3 +349,153 @@ class ObjectStoreTestCase(TestCase):
         """
         self.assertEqual(ObjectStore.get_container_path(Document.DocumentType.Rapportage),
                          f"upload_container_name/doc/rapportage")
+
+
+class DocumentIndexTestCase(TestCase):
+
+    def setUp(self):
+        self.index = DocumentIndex([
+            ('ontwerp', 'filename1.pdf'),
+            ('rapportage', 'filename2.pdf'),
+            ('rapportage', 'filename1.pdf'),
+        ])
+
+    def test_len(self):
+        self.assertEqual(len(self.index), 3)
+
+    def test_contains(self):
+        """
+        Test and assert that a document is only found in the folder of its type
+        """
+        self.assertTrue(self.index.contains(Document.DocumentType.Ontwerp, 'filename1.pdf'))
+        self.assertTrue(self.index.contains(Document.DocumentType.Rapportage, 'filename1.pdf'))
+        self.assertTrue(self.index.contains(Document.DocumentType.Rapportage, 'filename2.pdf'))
+        self.assertFalse(self.index.contains(Document.DocumentType.Ontwerp, 'filename2.pdf'))
+        self.assertFalse(self.index.contains(Document.DocumentType.Ontwerp, 'filename3.pdf'))
+
+    def test_get_folders(self):
+        self.assertEqual(self.index.get_folders('filename1.pdf'), {'ontwerp', 'rapportage'})
+        self.assertEqual(self.index.get_folders('filename3.pdf'), set())
+
+
+class DocumentCacheTestCase(TestCase):
+
+    def setUp(self):
+        self.cache = DocumentCache(tempfile.mkdtemp(), max_size=10)
+
+    def is_cached(self, object_name, etag):
+        file = self.cache.get('container', object_name, etag)
+        if file is None:
+            return False
+        file.close()
+        return True
+
+    def test_read_through(self):
+        """
+        Test and assert that the chunks are passed on, and cached once they are all read
+        """
+        chunks = self.cache.read_through('container', 'doc.pdf', 'etag1', iter([b'ab', b'cd']))
+        self.assertEqual(next(chunks), b'ab')
+        self.assertFalse(self.is_cached('doc.pdf', 'etag1'))
+        self.assertEqual(list(chunks), [b'cd'])
+
+        with self.cache.get('container', 'doc.pdf', 'etag1') as file:
+            self.assertEqual(file.read(), b'abcd')
+        self.assertFalse(self.is_cached('doc.pdf', 'etag2'))
+        self.assertFalse(self.is_cached('other.pdf', 'etag1'))
+
+    def test_get_removed(self):
+        """
+        Test and assert that a file taken from the cache can still be read when it is removed afterwards
+        """
+        list(self.cache.read_through('container', 'doc.pdf', 'etag', iter([b'ab'])))
+
+        with self.cache.get('container', 'doc.pdf', 'etag') as file:
+            self.cache.invalidate('container', 'doc.pdf')
+            self.assertEqual(file.read(), b'ab')
+        self.assertFalse(self.is_cached('doc.pdf', 'etag'))
+
+    def test_read_through_aborted(self):
+        """
+        Test and assert that a partially read document is not cached, and leaves no temporary file
+        """
+        chunks = self.cache.read_through('container', 'doc.pdf', 'etag1', iter([b'ab', b'cd']))
+        next(chunks)
+        chunks.close()
+
+        self.assertFalse(self.is_cached('doc.pdf', 'etag1'))
+        self.assertEqual(os.listdir(self.cache.get_object_dir('container', 'doc.pdf')), [])
+
+    def test_read_through_too_large(self):
+        chunks = self.cache.read_through('container', 'doc.pdf', 'etag1', iter([b'abcdef', b'ghijkl']), size='12')
+        self.assertEqual(list(chunks), [b'abcdef', b'ghijkl'])
+        self.assertFalse(self.is_cached('doc.pdf', 'etag1'))
+
+    def test_new_version(self):
+        """
+        Test and assert that caching a new version of a document removes the old version
+        """
+        list(self.cache.read_through('container', 'doc.pdf', 'etag1', iter([b'ab'])))
+        list(self.cache.read_through('container', 'doc.pdf', 'etag2', iter([b'cd'])))
+
+        self.assertFalse(self.is_cached('doc.pdf', 'etag1'))
+        self.assertTrue(self.is_cached('doc.pdf', 'etag2'))
+
+    def test_evict_least_recently_used(self):
+        """
+        Test and assert that the least recently used documents are removed when the cache is full
+        """
+        list(self.cache.read_through('container', 'doc1.pdf', 'etag', iter([b'1234'])))
+        list(self.cache.read_through('container', 'doc2.pdf', 'etag', iter([b'1234'])))
+        os.utime(self.cache.get_path('container', 'doc1.pdf', 'etag'), (1, 1))
+        os.utime(self.cache.get_path('container', 'doc2.pdf', 'etag'), (2, 2))
+        # reading doc1 makes doc2 the least recently used
+        self.assertTrue(self.is_cached('doc1.pdf', 'etag'))
+        list(self.cache.read_through('container', 'doc3.pdf', 'etag', iter([b'1234'])))
+
+        self.assertTrue(self.is_cached('doc1.pdf', 'etag'))
+        self.assertFalse(self.is_cached('doc2.pdf', 'etag'))
+        self.assertTrue(self.is_cached('doc3.pdf', 'etag'))
+
+    def test_evict_only_when_full(self):
+        """
+        Test and assert that the cache is only walked when its total size is unknown, or when it is full
+        """
+        with mock.patch('storage.objectstore.os.walk', wraps=os.walk) as mocked_walk:
+            list(self.cache.read_through('container', 'doc1.pdf', 'etag', iter([b'1234'])))
+            list(self.cache.read_through('container', 'doc2.pdf', 'etag', iter([b'1234'])))
+            list(self.cache.read_through('container', 'doc2.pdf', 'etag2', iter([b'123456'])))
+            self.assertEqual(mocked_walk.call_count, 1)
+
+            list(self.cache.read_through('container', 'doc3.pdf', 'etag', iter([b'1'])))
+            self.assertEqual(mocked_walk.call_count, 2)
+
+        self.assertFalse(self.is_cached('doc1.pdf', 'etag'))
+        self.assertTrue(self.is_cached('doc2.pdf', 'etag2'))
+        self.assertTrue(self.is_cached('doc3.pdf', 'etag'))
+
+    def test_invalidate(self):
+        list(self.cache.read_through('container', 'doc.pdf', 'etag', iter([b'ab'])))
+        self.cache.invalidate('container', 'doc.pdf')
+        self.assertFalse(self.is_cached('doc.pdf', 'etag'))
+
+    def test_disabled(self):
+        cache = DocumentCache(tempfile.mkdtemp(), max_size=0)
+        self.assertEqual(list(cache.read_through('container', 'doc.pdf', 'etag', iter([b'ab']))), [b'ab'])
+        self.assertIsNone(cache.get('container', 'doc.pdf', 'etag'))
+
+    @mock.patch("storage.objectstore.objectstore.get_connection")
+    @mock.patch("storage.objectstore.ObjectStore.get_container_path")
+    def test_upload_invalidates(self, mocked_get_container_path, mocked_get_connection):
+        """
+        Test and assert that uploading a document removes it from the cache
+        """
+        mocked_get_container_path.return_value = 'container'
+        ObjectStore.reset_connections()
+        list(self.cache.read_through('container', 'doc.pdf', 'etag', iter([b'ab'])))
+
+        with override_settings(DOCUMENT_CACHE_DIR=self.cache.directory, DOCUMENT_CACHE_MAX_SIZE=10):
+            ObjectStore(config='this is the config').upload(
+                ('mock', 'file'), Document(filename='doc.pdf', type=Document.DocumentType.Ontwerp))
+
+        self.assertFalse(self.is_cached('doc.pdf', 'etag'))